@@ -0,0 +1,86 @@
+"""
+Offline build of the texture atlas: every sprite the game loads with per-pixel alpha (see preload.manifest) is scaled
+ahead of time and packed into a few large pages, which Loader serves as subsurfaces. This replaces one file open and
+one runtime rescale per sprite variant with one file open per page.
+
+Run this module directly after changing any image. Sprites whose source image has changed since the atlas was built
+are loaded from the image file instead until the atlas is rebuilt.
+"""
+
+import json
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from loader import Loader
+import preload
+
+page_size = 1024
+padding = 1
+max_size = 512
+
+
+def sprites():
+    """The (filename, scale) of every alpha sprite in the manifest that is small enough to pack"""
+    variants = []
+    for kind, filename, options in preload.manifest():
+        if kind == "image" and options.get("alpha"):
+            variant = (f'{filename}.png' if '.' not in filename else filename, options.get("scale", 1))
+            if variant not in variants:
+                variants.append(variant)
+    return variants
+
+
+def pack(sizes):
+    """
+    Shelf packing: place the rectangles, tallest first, left to right in rows across as many pages as needed.
+
+    :param sizes: List of (width, height) tuples
+    :return: List of (page, x, y) in the same order as the sizes
+    """
+
+    places = [None] * len(sizes)
+    page, x, y, shelf = 0, 0, 0, 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i][0] + padding, sizes[i][1] + padding
+        if x + w > page_size:
+            x, y, shelf = 0, y + shelf, 0
+        if y + h > page_size:
+            page, x, y, shelf = page + 1, 0, 0, 0
+        places[i] = (page, x, y)
+        x += w
+        shelf = max(shelf, h)
+    return places
+
+
+def build():
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    variants = []
+    for filename, scale in sprites():
+        image = Loader.decode(filename, scale).convert_alpha()
+        if max(image.get_size()) <= max_size:
+            variants.append((filename, scale, image))
+    places = pack([image.get_size() for _, _, image in variants])
+
+    pages = [pygame.Surface((page_size, page_size), pygame.SRCALPHA) for _ in range(max(p for p, _, _ in places) + 1)]
+    index = {"sprites": {}, "pages": [f'atlas{i}.png' for i in range(len(pages))]}
+    for (filename, scale, image), (page, x, y) in zip(variants, places):
+        # The pages start fully transparent, so taking the maximum copies the pixels exactly (no alpha blending)
+        pages[page].blit(image, (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+        index["sprites"][Loader.key(filename, scale)] = {
+            "page": index["pages"][page], "rect": [x, y, *image.get_size()], "source": filename,
+            "mtime": os.stat(f'{Loader.image_dir}/{filename}').st_mtime_ns}
+
+    os.makedirs(Loader.atlas_dir, exist_ok=True)
+    for surface, name in zip(pages, index["pages"]):
+        pygame.image.save(surface, f'{Loader.atlas_dir}/{name}')
+    with open(f'{Loader.atlas_dir}/index.json', 'w') as file:
+        json.dump(index, file, indent=1, sort_keys=True)
+    print(f"Packed {len(variants)} sprites into {len(pages)} page(s) in {Loader.atlas_dir}/")
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,64 @@
+"""
+Benchmarks for comparing a take against the longest reference song.
+
+The take is the reference itself, started 150 ms late, sung 10% faster and with added noise. Run from the repository
+root with "python -m benchmarks.bench_compare" to check each comparison mode and feature set against the 60 fps frame
+budget.
+"""
+
+import glob
+import os
+import timeit
+
+import numpy as np
+
+import birdcall
+import features
+import references
+
+frame_budget = 1 / 60
+
+
+def longest_song():
+    return max(glob.glob(f'{references.audio_dir}/*Full.wav'), key=os.path.getsize)
+
+
+def setup():
+    global reference, take, compact_reference, compact_take
+    data, fs, reference = references.load(longest_song())
+    compact_reference = references.load(longest_song(), features.COMPACT)[2]
+    sound = np.asarray(data[::fs // birdcall.samplerate])
+    sound = np.concatenate((np.zeros(int(0.15 * birdcall.samplerate), dtype=np.float32), sound))
+    sound = np.interp(np.arange(0, len(sound), 1.1), np.arange(len(sound)), sound)
+    sound += np.random.default_rng(0).normal(0, 0.01, len(sound))
+    take = birdcall.get_transform(sound)
+    compact_take = birdcall.get_transform(sound, features.COMPACT)
+
+
+def time_compare_truncate():
+    birdcall.compare_transforms(take, reference)
+
+
+def time_compare_aligned():
+    birdcall.compare_transforms(take, reference, mode="aligned")
+
+
+def time_compare_compact_truncate():
+    birdcall.compare_transforms(compact_take, compact_reference, features=features.COMPACT)
+
+
+def time_compare_compact_aligned():
+    birdcall.compare_transforms(compact_take, compact_reference, mode="aligned", features=features.COMPACT)
+
+
+if __name__ == "__main__":
+    setup()
+    print(f"{longest_song()}: {reference.shape[1]} reference frames, {take.shape[1]} take frames")
+    for name, feature_set in (("", birdcall.default_features), ("compact_", features.COMPACT)):
+        for mode in ("truncate", "aligned"):
+            t1, t2 = (compact_take, compact_reference) if name else (take, reference)
+            score = birdcall.compare_transforms(t1, t2, mode=mode, features=feature_set)
+            elapsed = min(timeit.repeat(globals()[f"time_compare_{name}{mode}"], number=1, repeat=20))
+            verdict = "within" if elapsed < frame_budget else "OVER"
+            print(f"{name + mode:>16}: score {score:.3f}, {elapsed * 1000:.1f} ms "
+                  f"({verdict} {frame_budget * 1000:.1f} ms frame budget)")
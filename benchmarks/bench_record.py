@@ -0,0 +1,74 @@
+"""
+Benchmarks for the capture path, replaying a take into a birdcall.Capture through a fake input stream.
+"""
+
+import time
+
+import numpy as np
+
+import birdcall
+import references
+from benchmarks import fakes
+
+song = 'audio/Robin2.wav'
+frame = 1 / 60
+
+
+def setup():
+    global samples, duration
+    data, fs = references.load(song)[:2]
+    sound = np.asarray(data[::fs // birdcall.samplerate])
+    duration = len(sound) / birdcall.samplerate
+    samples = fakes.take(sound, birdcall.samplerate)
+
+
+def replay(speed, poll=0):
+    """
+    Record the take with the given playback speed, calling record() every poll seconds.
+
+    :return: Tuple of (durations of the record() calls, seconds between the last block arriving and "Finished")
+    """
+
+    calls = []
+    capture = birdcall.Capture()
+    session = capture.session(0)
+    session.start(duration)
+    base = session.buffer.head
+    stream = capture.stream = fakes.FakeInputStream(samples, birdcall.samplerate, birdcall.blocksize,
+                                                    capture.callback, speed)
+    with stream:
+        while True:
+            start = time.perf_counter()
+            state, sound = session.record(duration)
+            calls.append(time.perf_counter() - start)
+            if state == "Finished" or stream.finished.is_set() and state != "Recording":
+                break
+            time.sleep(poll)
+    capture.stream = None
+    if state != "Finished":
+        raise RuntimeError(f"Replay ended while {state}")
+    arrived = stream.arrival(session.onset + int(duration * birdcall.samplerate) - base)
+    return calls, time.perf_counter() - arrived
+
+
+def time_record_unpaced():
+    """Whole take delivered as fast as possible, with record() polled continuously"""
+    replay(None)
+
+
+def track_record_call_realtime():
+    """Mean cost in microseconds of a record() call once per frame while capturing in real time"""
+    calls, latency = replay(1, frame)
+    return np.mean(calls) * 1e6
+
+
+def track_record_call_8x():
+    """Mean cost in microseconds of a record() call once per frame while capturing at 8x real time"""
+    calls, latency = replay(8, frame)
+    return np.mean(calls) * 1e6
+
+
+def track_finish_latency_realtime():
+    """Milliseconds from the final block arriving to record() returning "Finished", polling once per frame"""
+    calls, latency = replay(1, frame)
+    return latency * 1000
@@ -0,0 +1,83 @@
+"""
+Benchmarks for several players recording at once, as in a multi-player installation: one multichannel fake stream is
+demultiplexed into a session per channel, and every session is scored on a shared worker pool.
+
+Each track_* result is the cost per player, so it stays flat for as long as adding a player is free.
+"""
+
+import time
+
+import numpy as np
+
+import birdcall
+import references
+import scoring
+from benchmarks import fakes
+
+song = 'audio/Robin2.wav'
+
+
+def setup():
+    global reference, duration, channels
+    data, fs, reference = references.load(song)
+    sound = np.asarray(data[::fs // birdcall.samplerate])
+    duration = len(sound) / birdcall.samplerate
+    # Every player sings the same take, with their own background noise
+    channels = np.stack([fakes.take(sound, birdcall.samplerate, seed=i) for i in range(8)], axis=1)
+
+
+def play(players, speed=None):
+    """
+    Record and score the take on the given number of channels at once.
+
+    :return: Tuple of (seconds from the first block to the last score, the scores)
+    """
+
+    capture = birdcall.Capture(channels=players)
+    sessions = [capture.session(i) for i in range(players)]
+    workers = scoring.pool(players)
+    services = [scoring.ScoringService(executor=workers) for _ in sessions]
+    scorers = [birdcall.Scorer(reference, duration) for _ in sessions]
+    for session in sessions:
+        session.start(duration)
+    pending = set(range(players))
+    stream = capture.stream = fakes.FakeInputStream(np.ascontiguousarray(channels[:, :players]), birdcall.samplerate,
+                                                    birdcall.blocksize, capture.callback, speed)
+    start = time.perf_counter()
+    with stream:
+        while pending:
+            for i in sorted(pending):
+                state, sound = sessions[i].record(duration)
+                if state == "Recording":
+                    services[i].feed(scorers[i], sound)
+                if state == "Finished":
+                    services[i].submit(scorers[i], sound)
+                    pending.discard(i)
+            if stream.finished.is_set() and pending and all(sessions[i].state != "Recording" for i in pending):
+                raise RuntimeError(f"Replay ended with {len(pending)} player(s) still waiting")
+            time.sleep(0)
+        scores = [service.future.result() for service in services]
+    elapsed = time.perf_counter() - start
+    capture.stream = None
+    workers.shutdown()
+    return elapsed, scores
+
+
+def track_ms_per_player_1():
+    """Milliseconds per player to capture and score a take delivered as fast as possible, with one player"""
+    return play(1)[0] / 1 * 1000
+
+
+def track_ms_per_player_2():
+    """As track_ms_per_player_1, with two players on one stream"""
+    return play(2)[0] / 2 * 1000
+
+
+def track_ms_per_player_4():
+    """As track_ms_per_player_1, with four players on one stream"""
+    return play(4)[0] / 4 * 1000
+
+
+def track_ms_per_player_8():
+    """As track_ms_per_player_1, with eight players on one stream"""
+    return play(8)[0] / 8 * 1000
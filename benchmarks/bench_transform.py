@@ -0,0 +1,90 @@
+"""
+Benchmarks for computing transforms, loading references and incremental scoring.
+"""
+
+import shutil
+import tempfile
+
+import numpy as np
+
+import birdcall
+import features
+import references
+from benchmarks import fakes
+
+song = 'audio/Owl3.wav'
+full_song = 'audio/OwlFull.wav'
+
+
+def setup():
+    global sound, full_sound, sweep, reference
+    data, fs = references.load(song)[:2]
+    sound = np.asarray(data[::fs // birdcall.samplerate])
+    data, fs = references.load(full_song)[:2]
+    full_sound = np.asarray(data[::fs // birdcall.samplerate])
+    sweep = fakes.chirp(2, birdcall.samplerate)
+    reference = references.load(song)[2]
+
+
+def time_transform_song():
+    birdcall.get_transform(sound)
+
+
+def time_transform_full_song():
+    birdcall.get_transform(full_sound)
+
+
+def time_transform_chirp():
+    birdcall.get_transform(sweep)
+
+
+def time_transform_compact():
+    birdcall.get_transform(full_sound, features.COMPACT)
+
+
+def peakmem_transform_full_song():
+    birdcall.get_transform(full_sound)
+
+
+def peakmem_transform_float32():
+    birdcall.get_transform(full_sound, features.Features(dtype=np.float32))
+
+
+def time_load_transform_cold():
+    """Decode and transform a song into an empty cache"""
+    cache_dir = references.cache_dir
+    references.cache_dir = tempfile.mkdtemp()
+    references.index = None
+    references.entries.clear()
+    try:
+        references.load(song)
+    finally:
+        shutil.rmtree(references.cache_dir)
+        references.cache_dir = cache_dir
+        references.index = None
+        references.entries.clear()
+
+
+def time_load_transform_warm():
+    """Memory-map a song from the cache"""
+    references.entries.clear()
+    references.load(song)
+
+
+def setup_scorer():
+    global scorer
+    scorer = birdcall.Scorer(reference, len(sound) / birdcall.samplerate)
+    scorer.update(sound[:-birdcall.blocksize])
+
+
+def time_scorer_update():
+    """One frame of incremental scoring, with one new block of audio"""
+    scorer.update(sound)
+
+
+def time_scorer_finish():
+    scorer.finish(sound)
+
+
+time_scorer_update.setup = setup_scorer
+time_scorer_finish.setup = setup_scorer
@@ -0,0 +1,78 @@
+"""
+Synthetic inputs and a stand-in for sounddevice.InputStream, so the audio pipeline can be benchmarked without a
+microphone.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+def chirp(duration, samplerate, f0=1000, f1=4000, amplitude=0.5):
+    """Linear frequency sweep from f0 to f1 Hz"""
+    t = np.arange(int(duration * samplerate)) / samplerate
+    phase = 2 * np.pi * (f0 * t + (f1 - f0) * t ** 2 / (2 * duration))
+    return (amplitude * np.sin(phase)).astype(np.float32)
+
+
+def take(sound, samplerate, lead=0.5, tail=1, noise=0.0005, seed=0):
+    """A recording of the given sound with lead and tail seconds of quiet background noise around it"""
+    rng = np.random.default_rng(seed)
+    signal = np.concatenate((np.zeros(int(lead * samplerate), dtype=np.float32), sound,
+                             np.zeros(int(tail * samplerate), dtype=np.float32)))
+    return signal + rng.normal(0, noise, len(signal)).astype(np.float32)
+
+
+class FakeInputStream:
+    """
+    Replays samples into a sounddevice-style callback from a background thread, one block at a time. Samples of
+    shape (length, channels) are delivered as a multichannel stream.
+
+    :param speed: Playback rate relative to real time, or None to deliver blocks as fast as possible
+    """
+
+    def __init__(self, samples, samplerate, blocksize, callback, speed=1):
+        self.samples = samples
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.speed = speed
+        self.thread = None
+        self.finished = threading.Event()
+        self.stopped = False
+        self.delivered = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        start = time.perf_counter()
+        for i in range(0, len(self.samples) - self.blocksize + 1, self.blocksize):
+            if self.stopped:
+                break
+            if self.speed:
+                delay = start + (i + self.blocksize) / self.samplerate / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            block = self.samples[i:i+self.blocksize]
+            self.callback(block if block.ndim == 2 else block[:, None], self.blocksize, None, None)
+            self.delivered.append((i + self.blocksize, time.perf_counter()))
+        self.finished.set()
+
+    def arrival(self, count):
+        """Time at which the first count samples had been delivered"""
+        return next(t for delivered, t in self.delivered if delivered >= count)
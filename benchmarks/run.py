@@ -0,0 +1,120 @@
+"""
+Run the benchmark suite and store the results for comparison across commits.
+
+Benchmarks follow the asv naming conventions: in every benchmarks/bench_*.py module, time_* functions are timed,
+peakmem_* functions report the peak memory traced during a call, and track_* functions return a value to record. A
+module-level setup() runs once per module, and a setup attribute on a benchmark function runs before every repeat.
+
+Usage: python -m benchmarks.run [PATTERN] [--repeat 10] [--compare REV]
+
+Results are written to benchmarks/results/<commit>.json. With --compare, each result is also shown relative to the
+stored results of another commit.
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+
+results_dir = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def commit(rev="HEAD"):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", rev], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def benchmarks(pattern=""):
+    """All (module, name, function) triples matching the given substring"""
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'bench_*.py'))):
+        module = importlib.import_module(f'benchmarks.{os.path.basename(path)[:-3]}')
+        names = [name for name in vars(module) if name.startswith(("time_", "peakmem_", "track_"))]
+        names = [name for name in names if pattern in f'{module.__name__}.{name}']
+        if names:
+            yield module, [(name, getattr(module, name)) for name in names]
+
+
+def measure(name, function, repeat):
+    """Run a benchmark and return its result as a dict"""
+    setup = getattr(function, "setup", None)
+    if name.startswith("track_"):
+        if setup:
+            setup()
+        return {"value": function()}
+    if name.startswith("peakmem_"):
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            function()
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "lineno"))
+        return {"peak_bytes": peak, "retained_blocks": blocks}
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {"min": times[0], "median": times[len(times) // 2]}
+
+
+def describe(result):
+    if "value" in result:
+        return f'{result["value"]:.3f}'
+    if "peak_bytes" in result:
+        return f'{result["peak_bytes"] / 2**20:.2f} MiB peak, {result["retained_blocks"]} blocks retained'
+    return f'{result["min"] * 1000:.3f} ms min, {result["median"] * 1000:.3f} ms median'
+
+
+def primary(result):
+    return result.get("value", result.get("peak_bytes", result.get("min")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the audio pipeline benchmarks")
+    parser.add_argument("pattern", nargs="?", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--compare", help="Commit whose stored results to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(os.path.join(results_dir, f'{commit(args.compare)}.json')) as file:
+            baseline = json.load(file)["results"]
+
+    results = {}
+    for module, functions in benchmarks(args.pattern):
+        if hasattr(module, "setup"):
+            module.setup()
+        for name, function in functions:
+            full_name = f'{module.__name__.split(".")[-1]}.{name}'
+            results[full_name] = result = measure(name, function, args.repeat)
+            line = f'{full_name:<50} {describe(result)}'
+            if full_name in baseline and primary(baseline[full_name]):
+                line += f'  ({primary(result) / primary(baseline[full_name]):.2f}x {args.compare})'
+            print(line)
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f'{commit()}.json')
+    stored = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            stored = json.load(file)["results"]
+    stored.update(results)
+    with open(path, 'w') as file:
+        json.dump({"commit": commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"), "results": stored}, file, indent=1)
+    print("Results written to", path)
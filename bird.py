@@ -52,6 +52,11 @@ class Bird:
     def song(self):
         return f"audio/{self.name}{self.progress}.wav"
 
+    @classmethod
+    def songs(cls, name):
+        """All of the songs the given bird will sing, in order"""
+        return [f"audio/{name}{i + 1}.wav" for i in range(len(cls.thresholds[name]))]
+
     def threshold(self):
         return self.thresholds[self.name][self.progress - 1] 
 
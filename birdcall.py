@@ -1,125 +1,336 @@
 import numpy as np
-import sounddevice as sd
-import soundfile as sf
-import queue
 import time
 
+from features import Features
+
 samplerate = 44100//5
+blocksize = 256
+default_features = Features(samplerate=samplerate)
 device = None
 
-stream = None
-q = queue.Queue()
-sound = None
-old_volume = 0
-state = None
-delay = 0
 
+class RingBuffer:
+    """
+    Fixed-capacity single-producer, single-consumer sample buffer.
 
-def init_stream():
-    global stream
-    try:
-        stream = sd.InputStream(
-            device=device, channels=1,
-            samplerate=samplerate, callback=audio_callback)
-        stream.__enter__()
+    Each sample is stored twice, one capacity apart, so that any span of up to capacity samples is available as a
+    contiguous view without copying. The producer (audio thread) only advances head and the consumer only advances
+    tail, so no locking is required.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=np.float32)
+        self.head = 0
+        self.tail = 0
+        self.overflow = 0
+
+    def write(self, samples):
+        """Append samples, dropping the whole block if it would overwrite samples the consumer still needs"""
+        n = len(samples)
+        if self.head + n - self.tail > self.capacity:
+            self.overflow += n
+            return False
+        i = self.head % self.capacity
+        m = min(n, self.capacity - i)
+        self.data[i:i+m] = samples[:m]
+        self.data[i+self.capacity:i+self.capacity+m] = samples[:m]
+        self.data[:n-m] = samples[m:]
+        self.data[self.capacity:self.capacity+n-m] = samples[m:]
+        self.head += n
         return True
-    except Exception as e:
-        print("Audio device not supported")
-        return False
+
+    def view(self, start, stop):
+        """Zero-copy view of the samples with absolute indices [start, stop)"""
+        i = start % self.capacity
+        return self.data[i:i+stop-start]
+
+
+preroll = 0.02
+retry_interval = 2
+captures = []
+
+
+class Session:
+    """
+    The recording state of one player: a gate on the samples of one input channel, the ring buffer they are kept in
+    and the onset detection that turns them into a recording.
+    """
+
+    def __init__(self, capacity=10 * samplerate):
+        self.buffer = RingBuffer(capacity)
+        self.sound = None
+        self.onset = 0
+        self.old_volume = 0
+        self.state = None
+        self.delay = 0
+        self.armed = 0
+
+    def start(self, duration=10):
+        """Call once to begin audio recording of up to duration seconds (opens the gate)"""
+        self.state = None
+        capacity = int(duration * samplerate) + samplerate
+        if self.buffer.capacity < capacity:
+            self.buffer = RingBuffer(capacity)
+        self.buffer.tail = self.buffer.head
+        self.armed = self.buffer.tail
+        self.sound = self.buffer.view(self.buffer.tail, self.buffer.tail)
+        self.old_volume = 0
+        self.delay = 0
+        self.state = "Waiting"
+
+    def stop(self):
+        """Stop recording (closes the gate, but leaves the stream running)"""
+        self.state = None
+
+    def write(self, samples):
+        """Called from the audio thread with each block of this session's channel"""
+        if self.state == "Waiting" or self.state == "Recording":
+            self.buffer.write(samples)
+
+    def record(self, duration, max_delay=0):
+        """Call iteratively until recording is finished"""
+        buffer = self.buffer
+        # All pending blocks are analysed at once, so a backlog after a slow frame costs little more than one block
+        while self.state == "Waiting" and buffer.head - buffer.tail >= blocksize:
+            blocks = min((buffer.head - buffer.tail) // blocksize, 128)
+            data = buffer.view(buffer.tail, buffer.tail + blocks * blocksize).reshape(blocks, blocksize)
+            volumes = np.abs(data).sum(axis=1) / blocksize
+            delays = np.arange(self.delay + blocksize, self.delay + (blocks + 1) * blocksize, blocksize)
+            baselines, final = _baselines(volumes, delays, self.old_volume)
+            triggered = (delays > 0.1 * samplerate) & (baselines > 0) & (volumes > 30 * baselines)
+            timeout = (baselines > 0) & (delays > max_delay * samplerate) if max_delay else False
+            stop = triggered | timeout
+            # Plain ints and floats, so that the buffer indices never become NumPy scalars
+            k = int(stop.argmax())
+            if not stop[k]:
+                buffer.tail += blocks * blocksize
+                self.delay = int(delays[-1])
+                self.old_volume = float(final)
+                continue
+            buffer.tail += k * blocksize
+            self.delay = int(delays[k])
+            self.old_volume = float(baselines[k])
+            if not triggered[k]:
+                self.state = "Timeout"
+                return self.state, self.sound
+            # The onset is the first sample above the threshold, less the pre-roll (but never before start was called)
+            first = int(np.argmax(np.abs(data[k]) > 30 * baselines[k]))
+            self.onset = max(buffer.tail + first - int(preroll * samplerate), self.armed)
+            buffer.tail = self.onset
+            self.state = "Recording"
+        if self.state == "Recording":
+            length = int(duration * samplerate)
+            self.sound = buffer.view(self.onset, min(buffer.head, self.onset + length))
+            if len(self.sound) >= length:
+                self.state = "Finished"
+        return self.state, self.sound
+
+
+class Capture:
+    """
+    One input stream, whose channels are demultiplexed into sessions, e.g. one player per channel of a multichannel
+    interface. The stream stays open between recordings: sessions only open and close the gate that lets their
+    channel into their buffer, so no audio is lost to reopening the device.
+    """
+
+    def __init__(self, device=None, channels=1):
+        """
+        :param device: Input device ID (see get_devices), or None for the default input
+        :param channels: Number of channels to open
+        """
+
+        self.device = device
+        self.channels = channels
+        self.sessions = {}
+        self.stream = None
+        self.status_count = 0
+        self.last_callback = 0
+        self.last_attempt = 0
+
+    def session(self, channel=0):
+        """The session recording the given channel, created on first use"""
+        if channel not in self.sessions:
+            self.sessions[channel] = Session()
+        return self.sessions[channel]
+
+    def open(self):
+        """Open the input stream, unless it is already running"""
+        if self.healthy():
+            return True
+        self.close()
+        # sounddevice is imported on first use, since importing it initializes PortAudio (which probes every device)
+        import sounddevice as sd
+        self.last_attempt = time.perf_counter()
+        try:
+            self.stream = sd.InputStream(
+                device=self.device, channels=self.channels, blocksize=blocksize,
+                samplerate=samplerate, callback=self.callback)
+            self.stream.__enter__()
+            self.last_callback = time.perf_counter()
+            captures.append(self)
+            return True
+        except Exception as e:
+            self.stream = None
+            print("Audio device not supported")
+            return False
+
+    def healthy(self, timeout=1):
+        """Whether the stream is open and still delivering blocks (it stops when its device is unplugged)"""
+        return self.stream is not None and self.stream.active and time.perf_counter() - self.last_callback < timeout
+
+    def due(self):
+        """Whether retry_interval seconds have passed since the last attempt to open the stream"""
+        return time.perf_counter() - self.last_attempt >= retry_interval
+
+    def reconnect(self):
+        """
+        Reopen the stream if it has stopped, e.g. after the microphone was unplugged, but at most once every
+        retry_interval seconds. This probes the audio devices, so call it from a background thread.
+
+        :return: Whether the stream is running
+        """
+        if self.healthy():
+            return True
+        if not self.due():
+            return False
+        self.close()
+        import sounddevice as sd
+        # PortAudio only lists devices when it is initialized, and sounddevice has no public way to rescan them, so
+        # it is reinitialized through its private functions (when they exist) to find newly plugged in devices. This
+        # would stop every other open stream, so it is skipped while another capture is still running.
+        if not any(capture.healthy() for capture in captures) and hasattr(sd, '_terminate'):
+            try:
+                sd._terminate()
+                sd._initialize()
+            except Exception:
+                pass
+        return self.open()
+
+    def close(self):
+        """Close the input stream"""
+        try:
+            self.stream.__exit__()
+        except Exception as e:
+            pass
+        self.stream = None
+        if self in captures:
+            captures.remove(self)
+
+    def callback(self, indata, frames, time_info, status):
+        """This is called (from a separate thread) for each audio block."""
+        self.last_callback = time.perf_counter()
+        if status:
+            self.status_count += 1
+            print("[ERROR]", status)
+        # Sessions may be added from the main thread while the stream is running
+        for channel, session in tuple(self.sessions.items()):
+            session.write(indata[:, channel])
+
+
+# The single player of the game records the first channel of the default capture
+capture = Capture()
+session = capture.session(0)
+
+
+def init_stream():
+    """Open the default capture on the configured device"""
+    capture.device = device
+    return capture.open()
+
+def healthy(timeout=1):
+    """Whether the default capture is still delivering blocks (see Capture.healthy)"""
+    return capture.healthy(timeout)
+
+def reconnect():
+    """Reopen the default capture if it has stopped (see Capture.reconnect)"""
+    return capture.reconnect()
+
+def reconnect_due():
+    """Whether the default capture may be reopened yet (see Capture.due)"""
+    return capture.due()
+
+def close():
+    """Close the default capture"""
+    capture.close()
 
 def get_devices():
+    import sounddevice as sd
     return sd.query_devices()
 
-def start():
-    """Call once to begin audio recording"""
-    global old_volume, state, sound, delay
-    q.queue.clear()
-    sound = np.zeros(0)
-    old_volume = 0
-    delay = 0
-    state = "Waiting"
+def start(duration=10):
+    """Begin a recording of up to duration seconds in the default session"""
+    session.start(duration)
 
 def stop():
-    try:
-        stream.__exit__()
-    except Exception as e:
-        pass
+    """Stop recording in the default session"""
+    session.stop()
 
 def record(duration, max_delay=0):
-    """Call iteratively until recording is finished"""
-    global old_volume, state, sound, delay
-    if not stream:
+    """Call iteratively until recording in the default session is finished (see Session.record)"""
+    if not capture.stream:
         return
-    while True:
-        try:
-            data = q.get_nowait()
-            if state == "Waiting":
-                delay += len(data)
-                volume = np.mean(np.abs(data))
-                if not old_volume:
-                    old_volume = volume
-                elif delay > 0.1 * samplerate and volume / old_volume > 30:
-                    state = "Recording"
-                elif max_delay and delay > max_delay * samplerate:
-                    state = "Timeout"
-                    return state, sound
-                window = min(delay, samplerate * 0.2)
-                old_volume = ((window - len(data)) * old_volume + len(data) * volume) / window
-            if state == "Recording":
-                sound = np.concatenate((sound, data))
-                if len(sound) >= duration * samplerate:
-                    sound = sound[:int(duration * samplerate)]
-                    state = "Finished"
-                    return state, sound
-        except queue.Empty:
-            return state, sound
-
-
-def audio_callback(indata, frames, time, status):
-    """This is called (from a separate thread) for each audio block."""
-    if status:
-        print("[ERROR]", status)
-    # Fancy indexing with mapping creates a (necessary!) copy:
-    downsample = 1
-    q.put(indata[::downsample, 0])
-
-
-def get_transform(sound):
-    # sound /= max(np.abs(sound))
-    # vol_max = max(np.abs(sound))
-    timestep = 0.01 # sec
-    freqstep = 4 # Hz
-    step = int(samplerate * timestep)
-    res = int(samplerate / freqstep)
-    n = (len(sound) - res) // step
-    transform = np.zeros((res//2+1, n))
-    for i in range(n):
-        # Compute frequency spectrum
-        transform[:, i] = np.abs(np.fft.rfft(sound[step*i:step*i+res]))# / (res / 2)
-        # Normalize volume
-        # transform[:, i] /= np.linalg.norm(transform[:, i])
-        # Filter for silence
-        # if np.max(np.abs(sound[step*i:step*i+res])) < vol_max / 100:
-        #     transform[:, i] *= 0
-
-    # Smooth frequency
-    freq_window = 200 # Hz
-    freq_kernel = np.ones(int(freq_window / freqstep))
-    freq_kernel /= len(freq_kernel)
-    for i in range(transform.shape[1]):
-        transform[:, i] = np.convolve(transform[:, i], freq_kernel, 'same')
-
-    # Smooth time
-    time_window = 0.2 # sec
-    time_kernel = np.ones(int(time_window / timestep))
-    time_kernel /= len(time_kernel)
-    for i in range(transform.shape[0]):
-        transform[i, :] = np.convolve(transform[i, :], time_kernel, 'same')
-
-    return transform
-
-
-def compare_transforms(t1, t2):
+    return session.record(duration, max_delay)
+
+
+def _baselines(volumes, delays, old_volume):
+    """
+    The background volume before each block, a running average over the last 0.2 s (or since the start), i.e. the
+    recurrence old = ((window - n) * old + n * volume) / window evaluated for all blocks at once.
+
+    :param volumes: Mean absolute value of each block
+    :param delays: Samples since the start of listening at the end of each block
+    :param old_volume: Background volume before the first block
+    :return: Tuple of (the background volume before each block, the background volume after the last block)
+    """
+
+    if not old_volume:
+        # While the background volume is zero (at the start, or after exactly silent blocks from a muted device), the
+        # next block just sets it
+        loud = np.flatnonzero(volumes)
+        if len(loud) == 0:
+            return np.zeros(len(volumes)), old_volume
+        k = loud[0]
+        if k + 1 == len(volumes):
+            return np.zeros(len(volumes)), volumes[k]
+        baselines, final = _baselines(volumes[k+1:], delays[k+1:], volumes[k])
+        return np.concatenate((np.zeros(k + 1), baselines)), final
+    windows = np.minimum(delays, samplerate * 0.2)
+    decay = 1 - blocksize / windows
+    gain = blocksize * volumes / windows
+    # With P the cumulative product of the decays, old[k] = P[k] * (old[0] + sum(gain[j] / P[j+1] for j < k))
+    products = np.cumprod(decay)
+    totals = old_volume + np.cumsum(gain / products)
+    after = products * totals
+    return np.concatenate(([old_volume], after[:-1])), after[-1]
+
+
+def audio_callback(indata, frames, time_info, status):
+    """The callback of the default capture"""
+    capture.callback(indata, frames, time_info, status)
+
+
+def get_transform(sound, features=None):
+    """
+    Compute the smoothed spectrogram of a recording, with frequency along the first axis.
+
+    :param features: Features describing the transform (defaults to default_features)
+    """
+    return (features or default_features).transform(sound)
+
+
+def compare_transforms(t1, t2, mode="truncate", max_lag=0.3, band=0.1, features=None):
+    """
+    Cosine similarity between two transforms.
+
+    :param mode: "truncate" compares the transforms frame by frame up to the shorter length, "aligned" first searches
+                 for the best time offset and tempo (see align_transforms)
+    :param max_lag: Largest time offset in seconds searched in "aligned" mode
+    :param band: Largest deviation in seconds from the offset allowed when warping in "aligned" mode
+    :param features: Features the transforms were computed with (defaults to default_features)
+    """
+    if mode == "aligned":
+        return align_transforms(t1, t2, max_lag, band, features)[0]
     n = min(t1.shape[1], t2.shape[1])
     t1 = t1[:, :n]
     t2 = t2[:, :n]
@@ -127,6 +338,200 @@ def compare_transforms(t1, t2):
     return np.sum(t1 * t2 / (np.linalg.norm(t1) * np.linalg.norm(t2)))
 
 
+def _pool(transform, size, hop):
+    """Sum blocks of size adjacent rows by hop adjacent frames (the smoothing already blurs them together)"""
+    n = transform.shape[0] // size * size
+    m = transform.shape[1] // hop * hop
+    pooled = np.add.reduceat(transform[:n, :m], np.arange(0, n, size), axis=0)
+    return np.add.reduceat(pooled, np.arange(0, m, hop), axis=1)
+
+
+def _normalize(transform):
+    norm = np.linalg.norm(transform, axis=0)
+    return np.divide(transform, norm, out=np.zeros_like(transform), where=norm > 0)
+
+
+def _best_lag(t1, t2, max_lag):
+    """Time offset (in frames) of t1 relative to t2 with the highest normalized cross-correlation"""
+    n1, n2 = t1.shape[1], t2.shape[1]
+    size = 1 << (n1 + n2).bit_length()
+    spectrum = np.sum(np.fft.rfft(t1, size, axis=1) * np.conj(np.fft.rfft(t2, size, axis=1)), axis=0)
+    correlation = np.fft.irfft(spectrum, size)
+    lags = np.arange(-min(max_lag, n2 - 1), min(max_lag, n1 - 1) + 1)
+    e1 = np.concatenate(([0], np.cumsum(np.sum(np.square(t1), axis=0))))
+    e2 = np.concatenate(([0], np.cumsum(np.sum(np.square(t2), axis=0))))
+    overlap1 = e1[np.minimum(n1, lags + n2)] - e1[np.maximum(lags, 0)]
+    overlap2 = e2[np.minimum(n2, n1 - lags)] - e2[np.maximum(-lags, 0)]
+    norm = np.sqrt(overlap1 * overlap2)
+    scores = np.divide(correlation[lags % size], norm, out=np.zeros(len(lags)), where=norm > 0)
+    return int(lags[np.argmax(scores)])
+
+
+def _warp(u1, u2, lag, band, penalty=0.05):
+    """
+    Banded dynamic time warping of the columns of u1 onto those of u2.
+
+    Each frame j of u2 is matched to frame p[j] of u1, with p non-decreasing in steps of at most 2 (tempos between
+    0x and 2x) and within band frames of j + lag (a Sakoe-Chiba window). The total similarity, less the given penalty
+    for every step that changes tempo, is maximized, so the cost is O(frames * band).
+
+    :return: Tuple of (first frame of u2, array p of matched frames of u1)
+    """
+    n1, n2 = u1.shape[1], u2.shape[1]
+    width = 2 * band + 1
+    j0 = max(0, -(lag + band))
+    j1 = min(n2, n1 - lag + band)
+    m = j1 - j0
+    if m <= 0:
+        return j0, np.zeros(0, dtype=int)
+    first = j0 + lag - band
+    left = max(0, -first)
+    right = max(0, first + m + width - 1 - n1)
+    padded = np.pad(u1, ((0, 0), (left, right)))
+    target = u2[:, j0:j1]
+    similarity = np.empty((m, width))
+    for k in range(width):
+        similarity[:, k] = np.einsum('fj,fj->j', padded[:, first+left+k:first+left+k+m], target)
+    i = first + np.arange(m)[:, None] + np.arange(width)
+    similarity[(i < 0) | (i >= n1)] = -np.inf
+
+    totals = np.empty((m, width))
+    totals[0] = similarity[0]
+    previous = np.full(width + 2, -np.inf)
+    candidates = np.lib.stride_tricks.sliding_window_view(previous, 3)
+    steps = np.array([-penalty, 0, -penalty])
+    for j in range(1, m):
+        previous[1:-1] = totals[j-1]
+        np.max(candidates + steps, axis=1, out=totals[j])
+        totals[j] += similarity[j]
+
+    k = int(np.argmax(totals[-1]))
+    path = [k] * m
+    totals = totals.tolist()
+    for j in range(m - 1, 0, -1):
+        options = totals[j-1]
+        scores = [options[k-1] - penalty if k > 0 else -np.inf, options[k],
+                  options[k+1] - penalty if k < width - 1 else -np.inf]
+        k += scores.index(max(scores)) - 1
+        path[j-1] = k
+    return j0, first + np.arange(m) + np.array(path)
+
+
+def align_transforms(t1, t2, max_lag=0.3, band=0.1, features=None):
+    """
+    Cosine similarity between two transforms after aligning them in time.
+
+    The best overall offset is found by FFT cross-correlation over lags of up to max_lag seconds, then the frames are
+    matched by dynamic time warping within band seconds of that offset. Both searches run on transforms pooled over
+    blocks of frequency bins and frames, and the final score compares the full transforms along the matched frames.
+
+    :return: Tuple of (score, offset of t1 relative to t2 in seconds)
+    """
+    features = features or default_features
+    timestep = features.timestep
+    hop = max(features.time_kernel // 5, 1)
+    p1 = _pool(np.asarray(t1), features.pool, hop)
+    p2 = _pool(np.asarray(t2), features.pool, hop)
+    if not p1.shape[1] or not p2.shape[1]:
+        return 0, 0
+    lag = _best_lag(p1, p2, round(max_lag / timestep / hop))
+    # Weight each reference frame by its loudness, so that silence can be matched to anything
+    weights = np.mean(np.linalg.norm(p2, axis=0))
+    j0, path = _warp(_normalize(p1), p2 / weights if weights else p2, lag, max(round(band / timestep / hop), 1))
+    if not len(path):
+        return 0, lag * hop * timestep
+
+    # Expand the path back to full resolution, keeping the tempo constant within each block of frames
+    path = (path[:, None] * hop + np.arange(hop)).ravel()
+    path = np.minimum(path, t1.shape[1] - 1)
+    reference = t2[:, j0*hop:j0*hop+len(path)]
+    norm = np.sqrt(np.sum(np.einsum('fj,fj->j', t1, t1)[path]) * np.einsum('fj,fj->', reference, reference))
+    score = np.einsum('fj,fj->', t1[:, path], reference) / norm if norm else 0
+    return score, lag * hop * timestep
+
+
+class Spectrogram:
+    """
+    The spectrum columns of a recording that is still being recorded, computed incrementally: extend only transforms
+    the frames added since the previous call.
+    """
+
+    def __init__(self, duration, features=None):
+        """
+        :param duration: Longest recording in seconds
+        :param features: Features describing the transform (defaults to default_features)
+        """
+
+        self.features = features or default_features
+        self.step = self.features.step
+        self.window = self.features.time_kernel
+        self.columns = np.zeros((self.features.size, self.features.frames(int(duration * self.features.samplerate))),
+                                dtype=self.features.dtype)
+        self.frames = 0
+
+    def extend(self, sound):
+        """
+        Transform any new frames of the recording so far.
+
+        :return: The number of leading columns that are final, i.e. whose time smoothing no longer depends on frames
+                 still to come
+        """
+
+        n = min(self.features.frames(len(sound)), self.columns.shape[1])
+        if n > self.frames:
+            self.columns[:, self.frames:n] = self.features.spectrum(sound[self.frames * self.step:], n - self.frames)
+            self.frames = n
+        return self.frames - (self.window - 1) // 2
+
+
+class Scorer(Spectrogram):
+    """
+    Incrementally compare a recording against a reference transform while it is still being recorded.
+
+    Pass the recording so far to update (e.g. once per frame) and the complete recording to finish. Only the frames
+    added since the previous call are transformed, and the final score equals
+    compare_transforms(get_transform(sound), reference).
+    """
+
+    def __init__(self, reference, duration, features=None):
+        super().__init__(duration, features)
+        self.reference = reference
+        self.reference_norms = np.concatenate(([0], np.cumsum(np.sum(np.square(reference), axis=0))))
+        self.scored = 0
+        self.dot = 0
+        self.norm = 0
+        self.partial = 0
+
+    def update(self, sound):
+        """Transform any new frames of the recording and return the score of the part that is complete so far"""
+        self._score(self.extend(sound))
+        return self.partial
+
+    def finish(self, sound):
+        """Score the complete recording"""
+        self.update(sound)
+        self._score(self.frames)
+        return self.partial
+
+    def score(self, sound):
+        """Score the complete recording from scratch (used when the scoring worker fails)"""
+        return compare_transforms(get_transform(sound, self.features), self.reference, features=self.features)
+
+    def _score(self, stop):
+        start = self.scored
+        stop = min(stop, self.reference.shape[1])
+        if stop <= start:
+            return
+        lo = max(start - self.window // 2, 0)
+        hi = min(stop + (self.window - 1) // 2, self.frames)
+        smoothed = self.features.smooth(self.columns[:, lo:hi])[:, start-lo:stop-lo]
+        self.dot += np.sum(smoothed * self.reference[:, start:stop])
+        self.norm += np.sum(np.square(smoothed))
+        self.scored = stop
+        norm = np.sqrt(self.norm * self.reference_norms[stop])
+        self.partial = self.dot / norm if norm else 0
+
+
 def plot_transform(transform):
     import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
@@ -146,23 +551,27 @@ def plot_compare_transforms(t1, t2):
 
 
 def load_transform(filename):
-    data, fs = sf.read(filename, dtype='float32')
+    """Play the given song and return its (cached) reference transform and duration"""
+    import references
+    import sounddevice as sd
+    data, fs, transform = references.load(filename)
     sd.play(data, fs)
-    downsample = fs // samplerate
-    return get_transform(data[::downsample]), len(data) / fs
+    return transform, len(data) / fs
 
 def write(data):
+    import soundfile as sf
     sf.write(f'sound_{time.time()}.wav', data, samplerate)
 
 def play(data):
+    import sounddevice as sd
     sd.play(data, samplerate)
 
 if __name__ == "__main__":
     init_stream()
     loaded, duration = load_transform("audio/Owl3.wav")
     time.sleep(duration)
-    with stream:
-        start()
+    with capture.stream:
+        start(duration+.5)
         while 1:
             state_, sound_ = record(duration+.5)
             if state_ == "Recording":
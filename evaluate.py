@@ -0,0 +1,91 @@
+"""
+Offline batch scoring of recorded takes (e.g. files saved with birdcall.write) against every bird song, for tuning
+Bird.thresholds and catching scoring regressions without a microphone.
+
+Usage: python evaluate.py TAKES [--out scores] [--mode aligned] [--features compact] [--workers 8]
+
+Writes the score matrix (one row per take, one column per reference) to OUT.csv and OUT.npy.
+"""
+
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import re
+import time
+
+import numpy as np
+import soundfile as sf
+
+import birdcall
+import features as feature_sets
+import references
+
+reference_transforms = None
+options = None
+
+
+def reference_songs():
+    """The bird songs in the audio directory, e.g. "audio/Owl3.wav" (but not "audio/OwlFull.wav")"""
+    return [song for song in references.songs() if re.fullmatch(r'[A-Za-z]+\d+\.wav', os.path.basename(song))]
+
+
+def init_worker(songs, features, mode):
+    global reference_transforms, options
+    reference_transforms = [references.load(song, features)[2] for song in songs]
+    options = {"features": features, "mode": mode}
+
+
+def score_take(filename):
+    """Scores of one take against every reference"""
+    features = options["features"]
+    data, fs = sf.read(filename, dtype='float32')
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    transform = birdcall.get_transform(data[::max(fs // features.samplerate, 1)], features)
+    return [birdcall.compare_transforms(transform, reference, mode=options["mode"], features=features)
+            for reference in reference_transforms]
+
+
+def evaluate(takes, songs, features, mode="truncate", workers=None):
+    """
+    Score every take against every reference song in parallel.
+
+    :return: Score matrix of shape (takes, songs)
+    """
+
+    # Build any missing cache entries once, so the workers only memory-map them
+    for song in songs:
+        references.load(song, features)
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(songs, features, mode)) as pool:
+        return np.array(pool.map(score_take, takes, chunksize=max(len(takes) // (4 * (workers or os.cpu_count())), 1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score recorded takes against every bird song")
+    parser.add_argument("takes", help="Directory of recorded WAV files")
+    parser.add_argument("--out", default="scores", help="Output path without extension")
+    parser.add_argument("--mode", choices=("truncate", "aligned"), default="truncate")
+    parser.add_argument("--features", choices=("default", "compact"), default="default")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    takes = sorted(glob.glob(os.path.join(args.takes, '*.wav')))
+    songs = reference_songs()
+    if not takes:
+        parser.error(f"No WAV files found in {args.takes}")
+    features = birdcall.default_features if args.features == "default" else feature_sets.COMPACT
+
+    start = time.perf_counter()
+    scores = evaluate(takes, songs, features, args.mode, args.workers)
+    elapsed = time.perf_counter() - start
+
+    np.save(f'{args.out}.npy', scores)
+    with open(f'{args.out}.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["take"] + [os.path.basename(song) for song in songs])
+        for take, row in zip(takes, scores):
+            writer.writerow([os.path.basename(take)] + [f'{score:.4f}' for score in row])
+    print(f"Scored {len(takes)} takes against {len(songs)} references in {elapsed:.2f} s "
+          f"({len(takes) / elapsed:.1f} takes/s), written to {args.out}.csv and {args.out}.npy")
@@ -0,0 +1,141 @@
+"""
+Configurable spectrogram features for comparing bird songs.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+
+def box_filter(x, size, axis):
+    """Moving average equivalent to np.convolve(x, np.ones(size) / size, 'same') along the given axis"""
+    x = np.moveaxis(x, axis, 0)
+    pad = [(size // 2 + 1, (size - 1) // 2)] + [(0, 0)] * (x.ndim - 1)
+    total = np.pad(x, pad)
+    np.cumsum(total, axis=0, out=total)
+    smoothed = total[size:] - total[:-size]
+    smoothed /= size
+    return np.moveaxis(smoothed, 0, axis)
+
+
+def mel(f):
+    return 2595 * np.log10(1 + f / 700)
+
+
+def inverse_mel(m):
+    return 700 * (10 ** (m / 2595) - 1)
+
+
+class Features:
+    """
+    Parameters of a smoothed magnitude spectrogram, with frequency along the first axis and time along the second.
+
+    With bands=None every FFT bin is kept and neighbouring bins are averaged over freq_window Hz. Otherwise the bins
+    are pooled into the given number of triangular mel- or log-spaced bands (and freq_window is unused), which makes
+    the transforms far smaller and faster to compare.
+    """
+
+    def __init__(self, samplerate=44100//5, timestep=0.01, freqstep=4, freq_window=200, time_window=0.2, bands=None,
+                 scale="mel", fmin=50, fmax=None, dtype=np.float64):
+        """
+        :param samplerate: Samplerate of the recordings in Hz
+        :param timestep: Hop between frames in seconds
+        :param freqstep: Frequency resolution of the FFT in Hz (which sets the frame length)
+        :param freq_window: Width of the frequency smoothing in Hz (linear bins only)
+        :param time_window: Width of the time smoothing in seconds
+        :param bands: Number of filterbank bands, or None to keep every FFT bin
+        :param scale: Spacing of the filterbank bands, either "mel" or "log"
+        :param fmin: Lower edge of the filterbank in Hz
+        :param fmax: Upper edge of the filterbank in Hz (defaults to the Nyquist frequency)
+        :param dtype: Floating point type of the transforms
+        """
+
+        self.samplerate = samplerate
+        self.timestep = timestep
+        self.freqstep = freqstep
+        self.freq_window = freq_window
+        self.time_window = time_window
+        self.bands = bands
+        self.scale = scale
+        self.fmin = fmin
+        self.fmax = fmax
+        self.dtype = np.dtype(dtype)
+
+        self.step = int(samplerate * timestep)
+        self.res = int(samplerate / freqstep)
+        self.time_kernel = int(time_window / timestep)
+        self.filterbank = self.make_filterbank() if bands else None
+
+    def params(self):
+        """All parameters that affect the transform"""
+        return {"samplerate": self.samplerate, "timestep": self.timestep, "freqstep": self.freqstep,
+                "freq_window": self.freq_window, "time_window": self.time_window, "bands": self.bands,
+                "scale": self.scale, "fmin": self.fmin, "fmax": self.fmax, "dtype": self.dtype.name}
+
+    def key(self):
+        """Short hash of the parameters, e.g. for naming cached transforms"""
+        return hashlib.sha1(json.dumps(self.params(), sort_keys=True).encode()).hexdigest()[:8]
+
+    @property
+    def size(self):
+        """Number of rows in a transform"""
+        return self.bands or self.res // 2 + 1
+
+    @property
+    def pool(self):
+        """Number of adjacent rows that carry roughly independent information"""
+        return 1 if self.bands else max(int(self.freq_window / self.freqstep) // 2, 1)
+
+    def make_filterbank(self):
+        """Triangular filters of unit area, as a (bands, FFT bins) matrix"""
+        fmax = self.fmax or self.samplerate / 2
+        if self.scale == "mel":
+            edges = inverse_mel(np.linspace(mel(self.fmin), mel(fmax), self.bands + 2))
+        elif self.scale == "log":
+            edges = np.geomspace(self.fmin, fmax, self.bands + 2)
+        else:
+            raise ValueError(f"Unknown filterbank scale: {self.scale}")
+        freqs = np.arange(self.res // 2 + 1) * self.samplerate / self.res
+        lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+        weights = np.maximum(0, np.minimum((freqs - lower) / (center - lower), (upper - freqs) / (upper - center)))
+        area = weights.sum(axis=1, keepdims=True)
+        return np.divide(weights, area, out=np.zeros_like(weights), where=area > 0).astype(self.dtype)
+
+    def frames(self, length):
+        """Number of frames in a transform of length samples"""
+        return max((length - self.res) // self.step, 0)
+
+    def spectrum(self, sound, n):
+        """
+        Frequency-smoothed (or pooled) magnitude spectra of the first n frames of a recording, before time smoothing.
+
+        All frames are taken as strided views of the signal and transformed with batched FFT calls, in chunks so that
+        the complex spectra never take more memory than the result.
+        """
+
+        sound = np.asarray(sound, dtype=self.dtype)
+        frames = np.lib.stride_tricks.sliding_window_view(sound, self.res)[:self.step*n:self.step]
+        transform = np.empty((n, self.res // 2 + 1), dtype=self.dtype)
+        chunk = max(n // 4, 64)
+        for i in range(0, n, chunk):
+            np.abs(np.fft.rfft(frames[i:i+chunk], axis=1), out=transform[i:i+chunk])
+        transform = transform.T
+        if self.bands:
+            return self.filterbank @ transform
+        return box_filter(transform, int(self.freq_window / self.freqstep), axis=0)
+
+    def smooth(self, transform):
+        """Time smoothing"""
+        return box_filter(transform, self.time_kernel, axis=1)
+
+    def transform(self, sound):
+        """Smoothed spectrogram of a recording"""
+        n = self.frames(len(sound))
+        if n == 0:
+            return np.zeros((self.size, 0), dtype=self.dtype)
+        return self.smooth(self.spectrum(sound, n))
+
+
+DEFAULT = Features()
+COMPACT = Features(timestep=0.02, freqstep=8, bands=64, dtype=np.float32)
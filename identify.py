@@ -0,0 +1,119 @@
+"""
+Identification of which bird song a recording is closest to, for free play.
+
+Every reference transform is zero-padded to the length of the longest and stacked into one matrix, so that a recording
+is compared against all of them with a single matrix-vector product. The scores equal
+birdcall.compare_transforms(transform, reference) for each reference, since the norms of every truncated length come
+from cumulative column energies rather than from the truncated arrays themselves.
+"""
+
+import numpy as np
+
+import birdcall
+import features as feature_sets
+import references
+
+
+class ReferenceIndex:
+
+    def __init__(self, songs, features=feature_sets.COMPACT):
+        """
+        :param songs: Filenames of the reference songs, e.g. ["audio/Owl1.wav", ...]
+        :param features: Features to compare with. The compact features keep the stacked matrix small enough to
+                         search on every audio block.
+        """
+
+        self.songs = list(songs)
+        self.features = features
+        loaded = [references.load(song, features) for song in self.songs]
+        transforms = [transform for _, _, transform in loaded]
+        self.durations = np.array([len(data) / fs for data, fs, _ in loaded])
+        self.lengths = np.array([transform.shape[1] for transform in transforms])
+        self.frames = int(self.lengths.max())
+        stacked = np.zeros((len(transforms), features.size, self.frames), dtype=features.dtype)
+        energies = np.zeros((len(transforms), self.frames + 1))
+        for i, transform in enumerate(transforms):
+            stacked[i, :, :transform.shape[1]] = transform
+            energies[i, 1:transform.shape[1] + 1] = np.cumsum(np.sum(np.square(transform), axis=0))
+            energies[i, transform.shape[1] + 1:] = energies[i, transform.shape[1]]
+        self.matrix = stacked.reshape(len(transforms), -1)
+        self.energies = energies
+        self.padded = np.zeros((features.size, self.frames), dtype=features.dtype)
+
+    @property
+    def duration(self):
+        """Length in seconds of the longest reference"""
+        return float(self.durations.max())
+
+    def scores(self, transform):
+        """Cosine similarity (see birdcall.compare_transforms) of the given transform to every reference"""
+        n = min(transform.shape[1], self.frames)
+        self.padded[:, :n] = transform[:, :n]
+        self.padded[:, n:] = 0
+        dots = self.matrix @ self.padded.ravel()
+        take = np.concatenate(([0], np.cumsum(np.sum(np.square(transform[:, :n]), axis=0))))
+        overlap = np.minimum(self.lengths, n)
+        norms = np.sqrt(take[overlap] * self.energies[np.arange(len(self.songs)), overlap])
+        return np.divide(dots, norms, out=np.zeros(len(self.songs)), where=norms > 0)
+
+    def match(self, transform, k=3):
+        """
+        The references most similar to the given transform.
+
+        :return: List of up to k (song, score) tuples, best first
+        """
+
+        scores = self.scores(transform)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.songs[i], float(scores[i])) for i in top]
+
+
+class Identifier(birdcall.Spectrogram):
+    """
+    Incrementally identify a recording against a ReferenceIndex while it is still being recorded, with the same
+    interface as birdcall.Scorer (so that it can run on the ScoringService). The partial score is that of the best
+    match so far, and matches holds the current top k.
+
+    The final score is that of the best match recomputed with the default features, since Bird.thresholds were tuned
+    on those (the compact features of the index score unrelated songs higher).
+    """
+
+    def __init__(self, index, duration, k=3):
+        super().__init__(duration, index.features)
+        self.index = index
+        self.k = k
+        self.matches = []
+        self.partial = 0
+
+    def update(self, sound):
+        """Transform any new frames of the recording and match the part that is complete so far"""
+        return self._match(self.extend(sound))
+
+    def finish(self, sound):
+        """Identify the complete recording and return the score of the best match with the default features"""
+        self.update(sound)
+        self._match(self.frames)
+        return self.rescore(sound)
+
+    def score(self, sound):
+        """Identify the complete recording from scratch (used when the scoring worker fails)"""
+        self.compare(birdcall.get_transform(sound, self.features))
+        return self.rescore(sound)
+
+    def compare(self, transform):
+        """Match a complete transform and return the score of the best match"""
+        self.matches = self.index.match(transform, self.k)
+        self.partial = self.matches[0][1]
+        return self.partial
+
+    def rescore(self, sound):
+        """Score of the recording against the best match with the default features (their reference is cached)"""
+        reference = references.load(self.matches[0][0])[2]
+        return birdcall.compare_transforms(birdcall.get_transform(sound), reference)
+
+    def _match(self, stop):
+        if stop <= 0:
+            return self.partial
+        return self.compare(self.features.smooth(self.columns[:, :self.frames])[:, :stop])
@@ -1,15 +1,132 @@
 """
-A static resource-loading class with automatic caching of images and audio effects.
+A static resource-loading class with automatic caching of images, audio effects, fonts and rendered text.
 """
 
+import json
+import os
+import threading
+from collections import OrderedDict
+
 import pygame
 
+import pack
+
+
+def size_of(resource):
+    """Approximate memory used by a Surface, a list of Surfaces or a Sound, in bytes"""
+    if isinstance(resource, (list, tuple)):
+        return sum(size_of(item) for item in resource)
+    if isinstance(resource, pygame.Surface):
+        if resource.get_parent() is not None:
+            return 0  # Subsurfaces share the memory of their parent
+        return resource.get_width() * resource.get_height() * resource.get_bytesize()
+    if isinstance(resource, pygame.mixer.Sound):
+        frequency, sample_format, channels = pygame.mixer.get_init() or (44100, -16, 2)
+        return int(resource.get_length() * frequency) * channels * abs(sample_format) // 8
+    return 0
+
+
+class Cache:
+    """
+    A dictionary of resources limited to a total size in bytes, which evicts the least recently used resources when
+    the budget is exceeded. Pinned resources are never evicted. Safe to use from several threads.
+    """
+
+    def __init__(self, budget):
+        """
+        :param budget: Maximum total size of the cached resources in bytes. Pinned resources count towards it but are
+                       never evicted, so they can keep the cache over budget on their own.
+        """
+
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.pinned = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        with self.lock:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def get(self, key):
+        """The resource with the given key (marking it as recently used), or None if it is not cached"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self[key]
+
+    def __setitem__(self, key, resource):
+        with self.lock:
+            if key in self.entries:
+                del self[key]
+            self.entries[key] = resource
+            self.sizes[key] = size_of(resource)
+            self.bytes += self.sizes[key]
+            self.evict(keep=key)
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.entries[key]
+            self.bytes -= self.sizes.pop(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def evict(self, keep=None):
+        """Remove the least recently used unpinned resources until the cache fits in its budget"""
+        with self.lock:
+            for key in list(self.entries):
+                if self.bytes <= self.budget:
+                    break
+                if key != keep and key not in self.pinned:
+                    del self[key]
+                    self.evictions += 1
+
+    def pin(self, key):
+        """Keep the resource with the given key (once loaded) in the cache until it is unpinned"""
+        with self.lock:
+            self.pinned.add(key)
+
+    def unpin(self, key):
+        with self.lock:
+            self.pinned.discard(key)
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.bytes, "budget": self.budget, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions, "pinned": len(self.pinned)}
+
 
 class Loader:
-    images = {}
-    audio = {}
+    images = Cache(32 * 2**20)
+    audio = Cache(64 * 2**20)
+    fonts = {}
+    texts = OrderedDict()
+    text_capacity = 64
+    text_hits = 0
+    text_misses = 0
+    atlas = None
     image_dir = 'images'
+    atlas_dir = 'atlas'
     audio_dir = 'audio'
+    font_dir = 'fonts'
 
     @classmethod
     def clear(cls, key=None):
@@ -25,11 +142,43 @@ class Loader:
             if key in cls.audio:
                 del cls.audio[key]
         else:
-            cls.images = {}
-            cls.audio = {}
+            cls.images.clear()
+            cls.audio.clear()
+            cls.fonts = {}
+            cls.texts = OrderedDict()
 
     @classmethod
-    def animation(cls, filename, frames=1, alpha=False, colorkey=-1, scale=1, mirror=False, rotate=0):
+    def unpin(cls, key):
+        """
+        Allow a pinned resource to be evicted from the cache again.
+
+        :param key: Key of the resource, e.g. "Song.wav" or "Image.png --scale 2"
+        """
+
+        cls.images.unpin(key)
+        cls.audio.unpin(key)
+
+    @classmethod
+    def stats(cls):
+        """Size and hit/miss/eviction counts of the image, audio and text caches"""
+        return {"images": cls.images.stats(), "audio": cls.audio.stats(),
+                "text": {"entries": len(cls.texts), "hits": cls.text_hits, "misses": cls.text_misses}}
+
+    @staticmethod
+    def key(filename, scale=1, mirror=False, rotate=0):
+        """Cache key of an image variant, e.g. "Image.png --scale 2 --rotate 90" """
+        key = filename
+        if scale:
+            key = f'{key} --scale {scale}'
+        if mirror:
+            key = f'{key} --mirror'
+        if rotate:
+            key = f'{key} --rotate {rotate}'
+        return key
+
+    @classmethod
+    def animation(cls, filename, frames=1, alpha=False, colorkey=-1, scale=1, mirror=False, rotate=0, pin=False,
+                  sheet=None):
         """
         Load an animation from a sprite-sheet, adding it to the cache if not previously loaded.
 
@@ -41,43 +190,45 @@ class Loader:
         :param scale: The image will be scaled by this factor (e.g. scale=2 will double the size)
         :param mirror: The image will be horizontally flipped if this parameter is True
         :param rotate: The image will be rotated counterclockwise by this angle in degrees (after any mirroring)
+        :param pin: Never evict the animation from the cache (until Loader.unpin is called with its key)
+        :param sheet: The sprite-sheet already decoded and scaled by Loader.decode (e.g. on another thread)
         :returns: A list of pygame Surfaces containing the animation frames
         """
 
         if '.' not in filename:
             filename = f'{filename}.png'
-        key = filename
-        if scale:
-            key = f'{key} --scale {scale}'
-        if mirror:
-            key = f'{key} --mirror'
-        if rotate:
-            key = f'{key} --rotate {rotate}'
-        if key in cls.images:
-            return cls.images[key]
-        sheet = pygame.image.load(f'{cls.image_dir}/{filename}')
-        if scale != 1:
-            sheet = pygame.transform.scale(sheet, [scale * sheet.get_width(), scale * sheet.get_height()])
-        if frames == 1:
-            animation = [sheet]
+        key = cls.key(filename, scale, mirror, rotate)
+        if pin:
+            cls.images.pin(key)
+        animation = cls.images.get(key)
+        if animation is not None:
+            return animation
+        if sheet is None and frames == 1 and alpha and cls.packed(filename, scale):
+            animation = [cls.region(filename, scale)]
         else:
-            w = sheet.get_width() / frames
-            h = sheet.get_height()
-            animation = []
+            if sheet is None:
+                sheet = cls.decode(filename, scale)
+            if frames == 1:
+                animation = [sheet]
+            else:
+                w = sheet.get_width() / frames
+                h = sheet.get_height()
+                animation = []
+                for i in range(frames):
+                    animation.append(sheet.subsurface((w * i, 0, w, h)))
             for i in range(frames):
-                animation.append(sheet.subsurface((w * i, 0, w, h)))
+                if alpha:
+                    animation[i] = animation[i].convert_alpha()
+                elif colorkey:
+                    ck = sheet.get_at((0, 0)) if colorkey == -1 else colorkey
+                    surface = pygame.Surface(animation[i].get_size())
+                    surface.fill(ck)
+                    surface.blit(animation[i], (0, 0))
+                    surface.set_colorkey(ck)
+                    animation[i] = surface.convert()
+                else:
+                    animation[i] = animation[i].convert()
         for i in range(frames):
-            if alpha:
-                animation[i] = animation[i].convert_alpha()
-            elif colorkey:
-                ck = sheet.get_at((0, 0)) if colorkey == -1 else colorkey
-                surface = pygame.Surface(animation[i].get_size())
-                surface.fill(ck)
-                surface.blit(animation[i], (0, 0))
-                surface.set_colorkey(ck)
-                animation[i] = surface.convert()
-            else:
-                animation[i] = animation[i].convert()
             if mirror:
                 animation[i] = pygame.transform.flip(animation[i], mirror, False)
             if rotate:
@@ -86,7 +237,7 @@ class Loader:
         return animation
 
     @classmethod
-    def image(cls, filename, alpha=False, colorkey=-1, scale=1, mirror=False, rotate=0):
+    def image(cls, filename, alpha=False, colorkey=-1, scale=1, mirror=False, rotate=0, pin=False, sheet=None):
         """
         Load an animation from a sprite-sheet, adding it to the cache if not previously loaded.
 
@@ -97,28 +248,181 @@ class Loader:
         :param scale: The image will be scaled by this factor (e.g. scale=2 will double the size)
         :param mirror: The image will be horizontally flipped if this parameter is True
         :param rotate: The image will be rotated counterclockwise by this angle in degrees (after any mirroring)
+        :param pin: Never evict the image from the cache (until Loader.unpin is called with its key)
+        :param sheet: The image already decoded and scaled by Loader.decode (e.g. on another thread)
         :returns: A pygame Surface containing the image
         """
 
         return cls.animation(filename, frames=1, alpha=alpha, colorkey=colorkey, scale=scale, mirror=mirror,
-                             rotate=rotate)[0]
+                             rotate=rotate, pin=pin, sheet=sheet)[0]
+
+    @classmethod
+    def decode(cls, filename, scale=1):
+        """
+        Load and scale an image without converting it to the display format (and without caching it), so that it can
+        run on a worker thread. Pass the result to Loader.image or Loader.animation to finish loading.
+
+        :param filename: Filename of the image (defaults to PNG if no extension is included)
+        :param scale: The image will be scaled by this factor (e.g. scale=2 will double the size)
+        :returns: A pygame Surface in the file's own pixel format
+        """
+
+        if '.' not in filename:
+            filename = f'{filename}.png'
+        sheet = pack.image(f'{cls.image_dir}/{filename}')
+        if sheet is None:
+            sheet = pygame.image.load(f'{cls.image_dir}/{filename}')
+        if scale != 1:
+            sheet = pygame.transform.scale(sheet, [scale * sheet.get_width(), scale * sheet.get_height()])
+        return sheet
+
+    @classmethod
+    def load_atlas(cls):
+        """
+        Read the index of the texture atlas built by atlas.py, leaving out sprites whose source image has changed
+        since the atlas was built (so they are loaded from the image file instead).
+
+        :returns: Dictionary from image cache key to the atlas page and rectangle of the sprite
+        """
+
+        try:
+            with open(f'{cls.atlas_dir}/index.json') as file:
+                index = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+        sprites = {}
+        for key, sprite in index["sprites"].items():
+            try:
+                if os.stat(f'{cls.image_dir}/{sprite["source"]}').st_mtime_ns == sprite["mtime"]:
+                    sprites[key] = sprite
+            except FileNotFoundError:
+                pass
+        return sprites
+
+    @classmethod
+    def packed(cls, filename, scale=1):
+        """Whether the given image variant can be loaded from the texture atlas"""
+        if cls.atlas is None:
+            cls.atlas = cls.load_atlas()
+        if '.' not in filename:
+            filename = f'{filename}.png'
+        return cls.key(filename, scale) in cls.atlas
+
+    @classmethod
+    def region(cls, filename, scale=1):
+        """
+        Load an image variant from the texture atlas, loading the atlas page it is on if necessary (pages are pinned).
+
+        :param filename: Filename of the image (defaults to PNG if no extension is included)
+        :param scale: Scale of the variant, as packed by atlas.py
+        :returns: A pygame Surface with per-pixel alpha, which is a subsurface of the atlas page
+        """
+
+        if not cls.packed(filename, scale):
+            raise KeyError(f"{filename} at scale {scale} is not in the texture atlas")
+        if '.' not in filename:
+            filename = f'{filename}.png'
+        sprite = cls.atlas[cls.key(filename, scale)]
+        key = f'{cls.atlas_dir}/{sprite["page"]}'
+        cls.images.pin(key)
+        page = cls.images.get(key)
+        if page is None:
+            page = [pygame.image.load(key).convert_alpha()]
+            cls.images[key] = page
+        return page[0].subsurface(sprite["rect"])
 
     @classmethod
-    def sound(cls, filename, volume=1):
+    def fade(cls, filename, alpha, levels=32, scale=1, mirror=False, rotate=0):
+        """
+        Load an image with per-pixel alpha at the given opacity. On first use the image is pre-blended at evenly spaced
+        opacities (its fade ramp), which are cached together, so fading never modifies the shared image surface.
+
+        :param filename: Filename of the image (defaults to PNG if no extension is included)
+        :param alpha: Opacity from 0 (transparent) to 255 (opaque), rounded to the nearest level of the ramp
+        :param levels: Number of opacities in the fade ramp
+        :param scale: The image will be scaled by this factor (e.g. scale=2 will double the size)
+        :param mirror: The image will be horizontally flipped if this parameter is True
+        :param rotate: The image will be rotated counterclockwise by this angle in degrees (after any mirroring)
+        :returns: A pygame Surface containing the faded image (shared, so it should not be modified)
+        """
+
+        if '.' not in filename:
+            filename = f'{filename}.png'
+        key = f'{cls.key(filename, scale, mirror, rotate)} --fade {levels}'
+        ramp = cls.images.get(key)
+        if ramp is None:
+            image = cls.image(filename, alpha=True, scale=scale, mirror=mirror, rotate=rotate)
+            ramp = []
+            for i in range(levels):
+                faded = image.copy()
+                faded.fill((255, 255, 255, round(255 * i / (levels - 1))), special_flags=pygame.BLEND_RGBA_MULT)
+                ramp.append(faded)
+            cls.images[key] = ramp
+        level = round(min(max(alpha, 0), 255) * (levels - 1) / 255)
+        return ramp[level]
+
+    @classmethod
+    def font(cls, filename, size):
+        """
+        Load a font, adding it to the cache if not previously loaded.
+
+        :param filename: Filename of the font (defaults to TTF if no extension is included)
+        :param size: Height of the font in pixels
+        :return: The loaded pygame.font.Font object
+        """
+
+        if '.' not in filename:
+            filename = f'{filename}.ttf'
+        key = f'{filename} --size {size}'
+        if key not in cls.fonts:
+            cls.fonts[key] = pygame.font.Font(f'{cls.font_dir}/{filename}', size)
+        return cls.fonts[key]
+
+    @classmethod
+    def text(cls, font, string, color=(255, 255, 255), antialias=True):
+        """
+        Render a line of text, reusing the surface if the same text was rendered recently. Only the text_capacity
+        most recently used renders are kept, so dynamic strings (e.g. scores) do not grow the cache without bound.
+
+        :param font: The pygame.font.Font to render with (see Loader.font)
+        :param string: The text to render
+        :param color: RGB tuple color of the text
+        :param antialias: Render the text with smooth edges
+        :return: A pygame Surface containing the text (shared, so it should not be modified)
+        """
+
+        key = (string, tuple(color), antialias, font)
+        if key in cls.texts:
+            cls.text_hits += 1
+            cls.texts.move_to_end(key)
+            return cls.texts[key]
+        cls.text_misses += 1
+        surface = font.render(string, antialias, color)
+        cls.texts[key] = surface
+        if len(cls.texts) > cls.text_capacity:
+            cls.texts.popitem(last=False)
+        return surface
+
+    @classmethod
+    def sound(cls, filename, volume=1, pin=False):
         """
         Plays the given sound effect, adding it to the cache if not previously loaded
 
         :param filename: Filename of the audio file (defaults to WAV if no extension is included)
         :param volume: Scale the volume of the sound effect (set to zero to stop the sound effect early)
+        :param pin: Never evict the sound effect from the cache (until Loader.unpin is called with its key)
         :return: The loaded pygame.Sound object
         """
 
         if '.' not in filename:
             filename = f'{filename}.wav'
-        if filename in cls.audio:
-            sound = cls.audio[filename]
-        else:
-            sound = pygame.mixer.Sound(f'{cls.audio_dir}/{filename}')
+        if pin:
+            cls.audio.pin(filename)
+        sound = cls.audio.get(filename)
+        if sound is None:
+            sound = pack.sound(f'{cls.audio_dir}/{filename}')
+            if sound is None:
+                sound = pygame.mixer.Sound(f'{cls.audio_dir}/{filename}')
             cls.audio[filename] = sound
         if volume:
             sound.set_volume(volume)
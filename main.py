@@ -1,3 +1,6 @@
+import time
+started = time.perf_counter()  # Before the other imports, so that the reported startup times include them
+
 import pygame
 import os
 import asyncio
@@ -5,7 +8,14 @@ import random
 
 from loader import Loader
 import birdcall
+import identify
+import profiler
+import references
 from bird import Bird
+from renderer import Renderer
+from prefetch import Prefetcher
+from preload import Preloader
+from scoring import ScoringService
 
 
 class Game:
@@ -23,41 +33,39 @@ class Game:
         self.score = 0
         self.threshold = 0
         self.attempts = 0
-        try:
-            with open("device_list.txt", 'w') as file:
-                file.writelines(str(birdcall.get_devices()))
-            with open("config.txt") as file:
-                line = file.readline()
-                if line:
-                    birdcall.device = int(line)
-        except ValueError:
-            print("Invalid device ID")
-        except FileNotFoundError:
-            print("Config file not found")
-        except PermissionError:
-            print("Could not write device_list to file")
+        self.audio_ready = False
+        self.first_frame = None
+        self.free_play = False
+        self.index = None
+        self.summoned = []
 
         self.sequence = list(Bird.thresholds.keys())
         random.shuffle(self.sequence)
 
         self.state = "Splash"
 
+        # Float samples, so that sound effects from the asset pack (see pack.py) are used without conversion
+        pygame.mixer.pre_init(44100, 32, 2)
         pygame.init()
         os.environ['SDL_VIDEO_WINDOW_POS'] = str(self.pos[0]) + ", " + str(self.pos[1])
         pygame.display.set_caption(self.name)
         self.screen = pygame.display.set_mode(size)
+        self.renderer = Renderer(self.screen)
         pygame.display.set_icon(Loader.image("IconSmall.png", alpha=True))
+        self.preloader = Preloader()
 
+        self.prefetcher = Prefetcher()
+        self.prefetcher.submit("audio", self.open_audio)
         self.bird = Bird(self.sequence[self.level])
-        self.font = pygame.font.Font("fonts/Cooper Black Regular.ttf", 40)
+        self.prefetch(self.level)
+        self.font = Loader.font("Cooper Black Regular.ttf", 40)
 
         self.reference_transform = None
         self.song_duration = 0
         self.recording = None
+        self.scorer = None
+        self.scoring = ScoringService()
 
-        if not birdcall.init_stream():
-            self.state = "Error"
-        birdcall.stop()
         Loader.music("Birdsong.wav").play(loops=-1)
         pygame.mixer.music.set_volume(1)
 
@@ -70,30 +78,71 @@ class Game:
         """ Iteratively check for input, update game state, and redraw screen """
         clock = pygame.time.Clock()
         while not self.quit:
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    self.key_pressed(event.key)
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    self.mouse_pressed(event.pos, event.button)
-                if event.type == pygame.QUIT:
-                    pygame.display.quit()
-                    return
+            with profiler.span("events"):
+                for event in pygame.event.get():
+                    if event.type == pygame.KEYDOWN:
+                        self.key_pressed(event.key)
+                    if event.type == pygame.MOUSEBUTTONDOWN:
+                        self.mouse_pressed(event.pos, event.button)
+                    if event.type == pygame.WINDOWEXPOSED:
+                        self.renderer.invalidate()
+                    if event.type == pygame.QUIT:
+                        self.preloader.shutdown()
+                        self.prefetcher.shutdown()
+                        self.scoring.shutdown()
+                        birdcall.close()
+                        pygame.display.quit()
+                        return
             dt = clock.tick(self.fps)
             for _ in range(self.ticks_per_frame):
-                self.update(dt, pygame.key.get_pressed())
-            self.draw(self.screen)
-            pygame.display.update()
+                with profiler.span("update", self.state):
+                    self.update(dt, pygame.key.get_pressed())
+            with profiler.span("draw"):
+                self.draw(self.renderer)
+                if profiler.enabled:
+                    self.renderer.blit(profiler.overlay(Loader.font("Cooper Black Regular.ttf", 14)), (10, 10))
+                dirty = self.renderer.present()
+            with profiler.span("display.update"):
+                if dirty:
+                    pygame.display.update(dirty)
+            if self.first_frame is None:
+                self.first_frame = time.perf_counter() - started
+                print(f"First frame after {self.first_frame:.2f} s")
+            if profiler.enabled:
+                profiler.gauge("audio queue (samples)", birdcall.session.buffer.head - birdcall.session.buffer.tail)
+                profiler.gauge("audio overflow (samples)", birdcall.session.buffer.overflow)
+                profiler.gauge("audio status flags", birdcall.capture.status_count)
             await asyncio.sleep(0)
 
     def update(self, dt, keys):
         self.t += dt/1000
         self.bird.update(dt)
-        if self.state == "Error":
-            if int(self.t) > int(self.t - dt):
-                if birdcall.init_stream():
-                    self.state = "Splash"
-                birdcall.stop()
-        if self.state == "Loading" and self.t > 1:
+        for bird in self.summoned:
+            bird.update(dt)
+        if not self.preloader.finished:
+            self.preloader.poll()
+            if self.preloader.finished:
+                print(f"Loaded {len(self.preloader.resources)} resources in {self.preloader.elapsed:.2f} s "
+                      f"(startup took {time.perf_counter() - started:.2f} s)")
+        if not self.audio_ready and self.prefetcher.ready("audio"):
+            self.audio_ready = True
+            if not self.prefetcher.wait("audio"):
+                self.state = "Error"
+        if self.state == "Error" and self.prefetcher.ready("reconnect"):
+            # Reopening the microphone probes the audio devices, so it runs in the background like open_audio
+            if self.prefetcher.wait("reconnect") or birdcall.healthy():
+                self.state = "Splash"
+            self.prefetcher.discard("reconnect")
+            if self.state == "Error" and birdcall.reconnect_due():
+                self.prefetcher.submit("reconnect", birdcall.reconnect)
+        if self.state == "Loading" and self.free_play and self.t > 1 and self.prefetcher.ready("index"):
+            self.index = self.prefetcher.wait("index")
+            self.song_duration = self.index.duration
+            self.state = "Waiting"
+            self.t = 0
+            birdcall.start(self.song_duration + 0.5)
+            self.scorer = identify.Identifier(self.index, self.song_duration + 0.5)
+        if self.state == "Loading" and not self.free_play and self.t > 1 and self.prefetcher.ready(self.bird.name):
             try:
                 self.reference_transform, self.song_duration = birdcall.load_transform(self.bird.song())
             except:
@@ -104,19 +153,38 @@ class Game:
         if self.state == "Listen" and self.t > self.song_duration + 0.5:
             self.state = "Waiting"
             self.t = 0
-            birdcall.init_stream()
-            birdcall.start()
+            birdcall.start(self.song_duration + 0.5)
+            self.scorer = birdcall.Scorer(self.reference_transform, self.song_duration + 0.5)
+        if (self.state == "Waiting" or self.state == "Recording") and not birdcall.healthy():
+            print("Microphone disconnected")
+            birdcall.stop()
+            self.state = "Error"
         if self.state == "Waiting" or self.state == "Recording":
             state, sound = birdcall.record(self.song_duration + 0.5)
             if state != self.state:
                 self.t = 0
             self.state = state
             self.recording = sound
+            if self.state == "Recording":
+                self.scoring.feed(self.scorer, self.recording)
             if self.state == "Finished":
                 self.t = 0
                 birdcall.stop()
-                transform = birdcall.get_transform(self.recording)
-                self.score = birdcall.compare_transforms(transform, self.reference_transform)
+                self.scoring.submit(self.scorer, self.recording)
+                self.state = "Scoring"
+        if self.state == "Scoring" and self.free_play:
+            score = self.scoring.poll(self.t)
+            if score is not None:
+                self.t = 0
+                self.summon(score)
+        if self.state == "Summoned" and self.t > 3:
+            self.state = "Loading"
+            self.t = 0
+        if self.state == "Scoring" and not self.free_play:
+            score = self.scoring.poll(self.t)
+            if score is not None:
+                self.t = 0
+                self.score = score
                 self.threshold = self.bird.threshold()
                 self.attempts += 1
                 print(f"{self.bird.name}-{self.bird.progress} ({self.attempts}): {round(self.score * 100)}% (goal = {round(self.threshold * 100)}%)")
@@ -140,6 +208,7 @@ class Game:
                 self.level = 0
                 Loader.music("Birdsong.wav").play(loops=-1)
             self.bird = Bird(self.sequence[self.level])
+            self.prefetch(self.level)
         if self.state == "Victory":
             if int(self.t * 100) != int(self.t * 100 - dt / 10):
                 if random.randint(1, 20) == 1:
@@ -147,32 +216,118 @@ class Game:
                     n = random.randint(1, 3)
                     Loader.sound(f"{bird}{n}").play()
 
+    def summon(self, score):
+        """
+        In free play, bring the bird whose song best matched the recording, if it matched well enough.
+
+        :param score: Score of the recording against the best match with the default features (see Identifier.finish)
+        """
+        song = self.scorer.matches[0][0]
+        name, progress = self.match(song)
+        self.score = score
+        self.threshold = Bird.thresholds[name][progress - 1]
+        print(f"Free play: {', '.join(f'{s} {round(v * 100)}%' for s, v in self.scorer.matches)} "
+              f"({name}-{progress}: {round(score * 100)}%, goal = {round(self.threshold * 100)}%)")
+        self.state = "Summoned"
+        if score > self.threshold:
+            self.summoned = [bird for bird in self.summoned if bird.name != name] + [Bird(name)]
+            Loader.sound(f"{name}{progress}").play()
+        else:
+            Loader.sound("Fail").play()
+
+    @staticmethod
+    def match(song):
+        """The name of the bird that sings the given song and which of its songs it is, e.g. ("Owl", 3)"""
+        for name in Bird.thresholds:
+            if song in Bird.songs(name):
+                return name, Bird.songs(name).index(song) + 1
+
+    @staticmethod
+    def build_index():
+        return identify.ReferenceIndex([song for name in Bird.thresholds for song in Bird.songs(name)])
+
+    @staticmethod
+    def open_audio():
+        """
+        Open the microphone chosen in config.txt (it stays open for the rest of the game), in the background since
+        importing sounddevice initializes PortAudio. The list of devices is only written on the first run or when the
+        chosen device does not work.
+
+        :return: Whether the microphone could be opened
+        """
+
+        try:
+            with open("config.txt") as file:
+                line = file.readline()
+                if line:
+                    birdcall.device = int(line)
+        except ValueError:
+            print("Invalid device ID")
+        except FileNotFoundError:
+            print("Config file not found")
+        success = birdcall.init_stream()
+        if not success or not os.path.exists("device_list.txt"):
+            try:
+                with open("device_list.txt", 'w') as file:
+                    file.writelines(str(birdcall.get_devices()))
+            except PermissionError:
+                print("Could not write device_list to file")
+        return success
+
+    def prefetch(self, level):
+        """
+        Warm the reference songs of the bird at the given level and the one after it. Its sprites are loaded by the
+        preloader, since images may only be converted on the main thread.
+        """
+        for name in self.sequence[level:level+2]:
+            self.prefetcher.submit(name, self.warm, name)
+
+    @staticmethod
+    def warm(name):
+        for song in Bird.songs(name):
+            references.load(song)
+
     def draw(self, surface):
-        surface.blit(Loader.image("Background", colorkey=None), (0, 0))
+        surface.blit(Loader.image("Background", colorkey=None, pin=True), (0, 0))
 
         if self.state == "Splash" or self.state == "Error":
-            surface.blit(Loader.image("Splash", alpha=True), (0, 0))
-            if self.t % 1 > 0.5:
+            surface.blit(Loader.image("Splash", alpha=True, pin=True), (0, 0))
+            if not self.preloader.finished or not self.audio_ready:
+                bar = pygame.Rect(self.size[0]/2 - 150, self.size[1] - 50, 300, 6)
+                surface.fill((80, 80, 80), bar)
+                surface.fill((255, 255, 255), (bar.x, bar.y, bar.w * self.preloader.progress, bar.h))
+            elif self.t % 1 > 0.5:
                 if self.state == "Splash":
-                    start = self.font.render("Press any key to begin", True, (255, 255, 255))
+                    start = Loader.text(self.font, "Press any key to begin, or F for free play")
                 else:
-                    start = self.font.render("Microphone not detected", True, (255, 255, 255))
+                    start = Loader.text(self.font, "Microphone not detected")
                 surface.blit(start, (self.size[0]/2 - start.get_width()/2, self.size[1] - start.get_height() - 30))
             return
         if self.state == "Victory":
-            surface.blit(Loader.image("Victory", alpha=True), (0, 0))
-            thanks = self.font.render("Thanks for playing!", True, (255, 255, 255))
+            surface.blit(Loader.image("Victory", alpha=True, pin=True), (0, 0))
+            thanks = Loader.text(self.font, "Thanks for playing!")
             surface.blit(thanks, (self.size[0]/2 - thanks.get_width()/2, self.size[1] - thanks.get_height()*2 - 60))
             if self.t % 1 > 0.5:
-                start = self.font.render("Press any key to play again", True, (255, 255, 255))
+                start = Loader.text(self.font, "Press any key to play again")
                 surface.blit(start, (self.size[0]/2 - start.get_width()/2, self.size[1] - start.get_height() - 30))
             return
 
-        self.bird.draw(surface)
-        
-        if self.state == "Listen" or self.state == "Loading" or self.state == "Complete":
-            ear = Loader.image("Ear", alpha=True, scale=0.5)
-            ear.set_alpha(abs((self.t+.75)%1.5 - .75) * 200 + 55 if self.state == "Listen" else 55)
+        if self.free_play:
+            for bird in self.summoned:
+                bird.draw(surface)
+        else:
+            self.bird.draw(surface)
+
+        if self.state == "Summoned":
+            if self.score > self.threshold:
+                feedback = f"The {self.summoned[-1].name} answered!"
+            else:
+                feedback = "No bird answered"
+            text = Loader.text(self.font, feedback)
+            surface.blit(text, (self.size[0]/2 - text.get_width()/2, self.size[1] - text.get_height() - 30))
+
+        if (self.state == "Listen" or self.state == "Loading" or self.state == "Complete") and not self.free_play:
+            ear = Loader.fade("Ear", abs((self.t+.75)%1.5 - .75) * 200 + 55 if self.state == "Listen" else 55, scale=0.5)
             if self.score == 0 or self.state == "Listen":
                 surface.blit(ear, (500 - ear.get_width() / 2, 570))
                 feedback = "Listen"
@@ -190,22 +345,50 @@ class Game:
                 feedback = "Listen carefully"
             else:
                 feedback = "Try again"
-            text = self.font.render(feedback, True, (255, 255, 255))
+            text = Loader.text(self.font, feedback)
             surface.blit(text, (self.size[0]/2 - text.get_width()/2, self.size[1] - ear.get_height() - text.get_height() - 30))
 
-        if self.state == "Waiting" or self.state == "Recording":
-            mic = Loader.image("Microphone", alpha=True, scale=0.5)
-            mic.set_alpha(abs((self.t+.75)%1.5 - .75) * 200 + 55 if self.state == "Recording" else 55)
-            if self.state == "Recording" or self.t > 0.2:
+        if self.state == "Waiting" or self.state == "Recording" or self.state == "Scoring":
+            mic = Loader.fade("Microphone", abs((self.t+.75)%1.5 - .75) * 200 + 55 if self.state == "Recording" else 55,
+                              scale=0.5)
+            if self.state != "Waiting" or self.t > 0.2:
                 surface.blit(mic, (500 - mic.get_width()/2, 570))
-                text = self.font.render("Respond", True, (255, 255, 255))
+                if not self.free_play:
+                    prompt = "Respond"
+                elif self.state == "Recording" and self.scorer.matches:
+                    # Live identification: the bird that would answer if the song ended now
+                    prompt = f"{self.match(self.scorer.matches[0][0])[0]}?"
+                else:
+                    prompt = "Sing to summon a bird"
+                text = Loader.text(self.font, prompt)
                 surface.blit(text, (self.size[0]/2 - text.get_width()/2, self.size[1] - mic.get_height() - text.get_height() - 30))
+            # In free play the partial score uses the compact features, which the thresholds do not apply to
+            if self.state == "Recording" and not self.free_play:
+                progress = min(max(self.scorer.partial / self.bird.threshold(), 0), 1)
+                bar = pygame.Rect(500 - mic.get_width()/2, 680, mic.get_width(), 6)
+                surface.fill((80, 80, 80), bar)
+                surface.fill((255, 255, 255), (bar.x, bar.y, bar.w * progress, bar.h))
 
-        watcher = Loader.image("Watcher", alpha=True)
+        watcher = Loader.image("Watcher", alpha=True, pin=True)
         surface.blit(watcher, (0, self.size[1] - watcher.get_height()))
 
     def key_pressed(self, key):
-        if key <= 255 and (self.state == "Splash" or self.state == "Victory"):
+        if key == pygame.K_F3:
+            if profiler.enabled:
+                profiler.disable()
+            else:
+                profiler.enable({birdcall: ("load_transform", "record"), birdcall.Scorer: ("update", "finish"),
+                                 identify.Identifier: ("update", "finish")})
+        if key == pygame.K_F4 and profiler.spans:
+            try:
+                print("Saved trace to", profiler.export())
+            except (OSError, TypeError, ValueError) as e:
+                print("Could not save trace:", e)
+        if key <= 255 and (self.state == "Splash" and self.preloader.finished and self.audio_ready or self.state == "Victory"):
+            # F on the title screen starts free play, where any song summons the bird it sounds most like
+            self.free_play = self.state == "Splash" and key == pygame.K_f
+            if self.free_play:
+                self.prefetcher.submit("index", self.build_index)
             self.state = "Loading"
             self.t = -1
             pygame.mixer.music.fadeout(1000)
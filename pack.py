@@ -0,0 +1,169 @@
+"""
+A single memory-mapped file holding every sound as raw PCM and every image as decoded pixels, so that resources load
+without opening and decoding individual files, and the game audio, the reference analysis and sounddevice playback
+can all read the same samples.
+
+Layout: the magic bytes, the length of a JSON index as a little-endian uint64, the index, then each resource aligned
+to 64 bytes. Sounds are interleaved float32 samples at the file's own samplerate and channel count, and images are
+RGBA bytes. The index records the modification time of each source file, and resources whose source has changed since
+the pack was built are loaded from the file instead.
+
+Run this module directly to build the pack after changing any image or sound.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import pygame
+
+filename = 'assets.pack'
+audio_dir = 'audio'
+image_dir = 'images'
+magic = b'SSPACK1\n'
+alignment = 64
+
+opened = None
+
+
+class AssetPack:
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(magic)] != magic:
+            raise ValueError(f"{path} is not an asset pack")
+        size, = struct.unpack_from('<Q', self.map, len(magic))
+        start = len(magic) + 8
+        self.index = json.loads(bytes(self.map[start:start + size]))
+
+    def entry(self, kind, path):
+        """The index entry of the given file if it is in the pack and unchanged since it was packed, otherwise None"""
+        entry = self.index[kind].get(os.path.normpath(path).replace(os.sep, '/'))
+        try:
+            if entry and os.stat(path).st_mtime_ns == entry["mtime"]:
+                return entry
+        except FileNotFoundError:
+            pass
+        return None
+
+    def samples(self, path):
+        """
+        :return: Tuple of (float32 array of shape (frames,) or (frames, channels) viewing the pack, samplerate), or
+                 None if the sound is not in the pack
+        """
+
+        entry = self.entry("sounds", path)
+        if entry is None:
+            return None
+        data = np.frombuffer(self.map, dtype=np.float32, count=entry["frames"] * entry["channels"],
+                             offset=entry["offset"])
+        return (data if entry["channels"] == 1 else data.reshape(-1, entry["channels"])), entry["samplerate"]
+
+    def pixels(self, path):
+        """
+        :return: Tuple of (RGBA bytes viewing the pack, (width, height)), or None if the image is not in the pack
+        """
+
+        entry = self.entry("images", path)
+        if entry is None:
+            return None
+        view = memoryview(self.map)[entry["offset"]:entry["offset"] + entry["width"] * entry["height"] * 4]
+        return view, (entry["width"], entry["height"])
+
+
+def current():
+    """The asset pack, memory-mapped on first use, or None if it has not been built"""
+    global opened
+    if opened is None:
+        try:
+            opened = AssetPack(filename)
+        except (FileNotFoundError, ValueError):
+            opened = False
+    return opened or None
+
+
+def samples(path):
+    """Samples and samplerate of the given sound file from the pack (see AssetPack.samples), or None"""
+    assets = current()
+    return assets.samples(path) if assets else None
+
+
+def image(path):
+    """The given image file from the pack as a Surface with per-pixel alpha viewing the pack, or None"""
+    assets = current()
+    pixels = assets.pixels(path) if assets else None
+    if pixels is None:
+        return None
+    return pygame.image.frombuffer(*pixels, 'RGBA')
+
+
+def sound(path):
+    """
+    The given sound file from the pack as a pygame Sound, or None. Sounds already in the mixer's format are passed
+    straight to pygame, and others are converted to it first.
+    """
+
+    packed = samples(path)
+    mixer = pygame.mixer.get_init()
+    if packed is None or mixer is None or mixer[1] not in (32, -32, -16):
+        return None
+    data, samplerate = packed
+    frequency, size, channels = mixer
+    if data.ndim == 1:
+        data = data[:, None]
+    if samplerate != frequency:
+        times = np.arange(int(len(data) * frequency / samplerate)) * samplerate / frequency
+        data = np.stack([np.interp(times, np.arange(len(data)), data[:, i]) for i in range(data.shape[1])], axis=1)
+    if data.shape[1] != channels:
+        data = np.repeat(data.mean(axis=1, keepdims=True), channels, axis=1)
+    if size == -16:
+        data = (np.clip(data, -1, 1) * 32767).astype(np.int16)
+    return pygame.mixer.Sound(buffer=np.ascontiguousarray(data, dtype=np.int16 if size == -16 else np.float32))
+
+
+def build():
+    import soundfile as sf
+
+    index = {"sounds": {}, "images": {}}
+    blobs = []
+    offset = 0
+    for path in sorted(glob.glob(f'{audio_dir}/*.wav')):
+        data, samplerate = sf.read(path, dtype='float32', always_2d=True)
+        index["sounds"][path.replace(os.sep, '/')] = {
+            "offset": offset, "frames": len(data), "channels": data.shape[1], "samplerate": samplerate,
+            "mtime": os.stat(path).st_mtime_ns}
+        blobs.append(np.ascontiguousarray(data).tobytes())
+        offset += -(-len(blobs[-1]) // alignment) * alignment
+    for path in sorted(glob.glob(f'{image_dir}/*.png')):
+        surface = pygame.image.load(path)
+        index["images"][path.replace(os.sep, '/')] = {
+            "offset": offset, "width": surface.get_width(), "height": surface.get_height(),
+            "mtime": os.stat(path).st_mtime_ns}
+        blobs.append(pygame.image.tobytes(surface, 'RGBA'))
+        offset += -(-len(blobs[-1]) // alignment) * alignment
+
+    # Offsets in the index are relative to the end of the header, so shift them once its size is known
+    header = json.dumps(index).encode()
+    start = -(-(len(magic) + 8 + len(header) + 64) // alignment) * alignment
+    for entries in index.values():
+        for entry in entries.values():
+            entry["offset"] += start
+    header = json.dumps(index).encode()
+    assert len(magic) + 8 + len(header) <= start
+    with open(f'{filename}.tmp', 'wb') as file:
+        file.write(magic + struct.pack('<Q', len(header)) + header)
+        file.write(bytes(start - file.tell()))
+        for blob in blobs:
+            file.write(blob)
+            file.write(bytes(-len(blob) % alignment))
+    os.replace(f'{filename}.tmp', filename)
+    print(f"Packed {len(index['sounds'])} sounds and {len(index['images'])} images into {filename} "
+          f"({os.path.getsize(filename) / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,42 @@
+"""
+Background loading of upcoming resources, so that the frame loop only ever picks up work that is already complete.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher:
+
+    def __init__(self, workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.futures = {}
+
+    def submit(self, key, fn, *args):
+        """
+        Schedule fn(*args) on the worker thread unless the given key is already scheduled.
+
+        :param key: Name of the task, e.g. the bird being prefetched
+        :return: The Future for the task
+        """
+
+        if key not in self.futures:
+            self.futures[key] = self.executor.submit(fn, *args)
+        return self.futures[key]
+
+    def ready(self, key):
+        """Whether the task with the given key has finished (or was never scheduled, so can run right away)"""
+        future = self.futures.get(key)
+        return future is None or future.done()
+
+    def wait(self, key):
+        """Block until the task with the given key has finished and return its result (None if never scheduled)"""
+        future = self.futures.get(key)
+        return future.result() if future else None
+
+    def discard(self, key):
+        future = self.futures.pop(key, None)
+        if future:
+            future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
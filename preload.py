@@ -0,0 +1,94 @@
+"""
+Loading of every image and sound effect up front while the splash screen is shown, so that no state of the game has
+to load resources when it is first drawn.
+
+Files are decoded on worker threads (pygame releases the GIL while reading and decoding them), and images are then
+converted to the display format on the main thread.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from loader import Loader
+from bird import Bird
+
+
+def manifest():
+    """
+    Every resource the game uses, with the options it is loaded with.
+
+    :return: List of ("image", filename, options) and ("sound", filename, {}) tuples
+    """
+
+    images = [("Background", {"colorkey": None, "pin": True}), ("Splash", {"alpha": True, "pin": True}),
+              ("Victory", {"alpha": True, "pin": True}), ("Watcher", {"alpha": True, "pin": True}),
+              ("Ear", {"alpha": True, "scale": 0.5}), ("Microphone", {"alpha": True, "scale": 0.5})]
+    sounds = ["Complete", "Success", "Fail"]
+    for name in Bird.thresholds:
+        images += [(name, {"alpha": True, "scale": 0.2}), (name, {"alpha": True, "scale": 1})]
+        sounds += [f"{name}{i + 1}" for i in range(len(Bird.thresholds[name]))]
+    return [("image", filename, options) for filename, options in images] + \
+           [("sound", filename, {}) for filename in sounds]
+
+
+class Preloader:
+
+    def __init__(self, resources=None, workers=4):
+        """
+        Start decoding resources in the background.
+
+        :param resources: List of resources as returned by manifest() (defaults to the whole manifest)
+        :param workers: Number of decoding threads
+        """
+
+        self.resources = manifest() if resources is None else resources
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preload")
+        self.start = time.perf_counter()
+        self.elapsed = None
+        self.loaded = 0
+        self.pending = [(kind, filename, options, self.executor.submit(self.decode, kind, filename, options))
+                        for kind, filename, options in self.resources]
+
+    @staticmethod
+    def decode(kind, filename, options):
+        if kind == "image":
+            if options.get("alpha") and Loader.packed(filename, options.get("scale", 1)):
+                return None  # Served from the texture atlas instead
+            return Loader.decode(filename, options.get("scale", 1))
+        return Loader.sound(filename)
+
+    def poll(self, budget=0.004):
+        """
+        Finish loading decoded images on the main thread, spending at most about budget seconds.
+
+        :return: The fraction of resources loaded so far
+        """
+
+        start = time.perf_counter()
+        while self.pending and self.pending[0][3].done() and time.perf_counter() - start < budget:
+            kind, filename, options, future = self.pending.pop(0)
+            try:
+                if kind == "image":
+                    Loader.image(filename, sheet=future.result(), **options)
+                else:
+                    future.result()
+            except (pygame.error, FileNotFoundError) as e:
+                print("Could not preload", filename, e)
+            self.loaded += 1
+        if not self.pending and self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.start
+            self.executor.shutdown(wait=False)
+        return self.progress
+
+    @property
+    def progress(self):
+        return self.loaded / len(self.resources) if self.resources else 1
+
+    @property
+    def finished(self):
+        return self.elapsed is not None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,199 @@
+"""
+Opt-in timing of the frame loop and the audio pipeline, with rolling percentiles for the in-game overlay (F3 toggles
+it, F4 saves the trace) and export to the Chrome trace format for offline analysis (open the file in chrome://tracing
+or https://ui.perfetto.dev).
+
+While disabled, span() returns a shared do-nothing context manager and no functions are wrapped, so the only cost is
+one function call per phase. Spans may be recorded from any thread, e.g. the scoring worker.
+"""
+
+import functools
+import json
+import threading
+import time
+import types
+from collections import deque
+
+import numpy as np
+import pygame
+
+enabled = False
+window = 300
+spans = {}
+gauges = {}
+events = deque(maxlen=200000)
+threads = {}
+wrapped = {}
+origin = time.perf_counter()
+overlay_surface = None
+overlay_time = 0
+lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        record(self.name, self.start, time.perf_counter())
+
+
+class NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+null_span = NullSpan()
+
+
+def span(name, detail=None):
+    """
+    Context manager that times the enclosed block (or does nothing while the profiler is disabled).
+
+    :param name: Name of the phase, e.g. "draw"
+    :param detail: Optional qualifier, e.g. the game state, recorded as "name:detail"
+    """
+
+    if not enabled:
+        return null_span
+    return Span(f'{name}:{detail}' if detail else name)
+
+
+def record(name, start, end):
+    """Add a completed span, with times from time.perf_counter"""
+    thread = threading.get_ident()
+    with lock:
+        if name not in spans:
+            spans[name] = deque(maxlen=window)
+        spans[name].append(end - start)
+        if thread not in threads:
+            threads[thread] = threading.current_thread().name
+        events.append(("X", name, start, end - start, thread))
+
+
+def gauge(name, value):
+    """Record the current value of a quantity, e.g. the number of samples waiting in the audio buffer"""
+    if enabled:
+        # NumPy scalars are stored as Python numbers, so that the trace can always be written as JSON
+        value = value.item() if hasattr(value, "item") else value
+        with lock:
+            gauges[name] = value
+            events.append(("C", name, time.perf_counter(), value, threading.get_ident()))
+
+
+def timed(name, fn):
+    """Wrap fn so that every call is recorded as a span"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, start, time.perf_counter())
+    return wrapper
+
+
+def enable(targets=None):
+    """
+    Start recording, wrapping the given module functions or methods so that each call is timed.
+
+    :param targets: Dictionary from module or class to the names of its functions to time, e.g.
+                    {birdcall: ["record"], birdcall.Scorer: ["update"]}
+    """
+
+    global enabled
+    for target, names in (targets or {}).items():
+        prefix = target.__name__ if isinstance(target, types.ModuleType) else f'{target.__module__}.{target.__name__}'
+        for name in names:
+            if (target, name) not in wrapped:
+                wrapped[(target, name)] = getattr(target, name)
+                setattr(target, name, timed(f'{prefix}.{name}', wrapped[(target, name)]))
+    enabled = True
+
+
+def disable():
+    """Stop recording and restore every wrapped function (the recorded spans are kept for export)"""
+    global enabled
+    enabled = False
+    for (target, name), fn in wrapped.items():
+        setattr(target, name, fn)
+    wrapped.clear()
+
+
+def summary():
+    """
+    Rolling percentiles of every span over the last window calls.
+
+    :return: List of (name, calls, p50, p95, p99) with times in milliseconds, sorted by name
+    """
+
+    with lock:
+        recent = {name: list(durations) for name, durations in spans.items()}
+    rows = []
+    for name in sorted(recent):
+        durations = np.array(recent[name]) * 1000
+        if len(durations):
+            p50, p95, p99 = np.percentile(durations, (50, 95, 99)).tolist()
+            rows.append((name, len(durations), p50, p95, p99))
+    return rows
+
+
+def overlay(font, interval=0.5):
+    """
+    Table of the rolling percentiles and the latest gauge values, re-rendered at most every interval seconds.
+
+    :return: A pygame Surface with per-pixel alpha
+    """
+
+    global overlay_surface, overlay_time
+    now = time.perf_counter()
+    if overlay_surface is not None and now - overlay_time < interval:
+        return overlay_surface
+    rows = [("phase (ms)", "p50", "p95", "p99")]
+    rows += [(name, f'{p50:.2f}', f'{p95:.2f}', f'{p99:.2f}') for name, _, p50, p95, p99 in summary()]
+    with lock:
+        latest = sorted(gauges.items())
+    rows += [(name, "", "", str(value)) for name, value in latest]
+    rendered = [[font.render(cell, True, (255, 255, 255)) for cell in row] for row in rows]
+    first = max(row[0].get_width() for row in rendered) + 20
+    column = max(cell.get_width() for row in rendered for cell in row[1:]) + 20
+    height = font.get_linesize()
+    overlay_surface = pygame.Surface((first + 3 * column + 20, len(rows) * height + 20), pygame.SRCALPHA)
+    overlay_surface.fill((0, 0, 0, 160))
+    for i, row in enumerate(rendered):
+        overlay_surface.blit(row[0], (10, 10 + i * height))
+        for j, cell in enumerate(row[1:]):
+            # Right-align the numbers
+            overlay_surface.blit(cell, (10 + first + (j + 1) * column - cell.get_width(), 10 + i * height))
+    overlay_time = now
+    return overlay_surface
+
+
+def export(filename="trace.json"):
+    """Write every recorded span and gauge in the Chrome trace event format"""
+    with lock:
+        names = list(threads.items())
+        recorded = list(events)
+    trace = [{"name": "thread_name", "ph": "M", "pid": 0, "tid": thread, "args": {"name": name}}
+             for thread, name in names]
+    for phase, name, start, value, thread in recorded:
+        if phase == "X":
+            trace.append({"name": name, "ph": "X", "pid": 0, "tid": thread, "ts": (start - origin) * 1e6,
+                          "dur": value * 1e6})
+        else:
+            trace.append({"name": name, "ph": "C", "pid": 0, "tid": thread, "ts": (start - origin) * 1e6,
+                          "args": {name: value}})
+    with open(filename, 'w') as file:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+    return filename
@@ -0,0 +1,161 @@
+"""
+A disk cache of the reference transforms for every song in the audio directory.
+
+Decoded samples are keyed by the file path and its modification time, and transforms additionally by the parameters of
+the Features they were computed with. Both are stored as .npy files that are memory-mapped on load, and are rebuilt
+automatically when a WAV file or a transform parameter changes. Run this module directly to build the whole cache
+ahead of time.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+import birdcall
+import features as feature_sets
+import pack
+
+cache_dir = 'cache'
+audio_dir = 'audio'
+
+entries = {}
+index = None
+lock = threading.Lock()
+
+
+def normpath(filename):
+    return os.path.normpath(filename).replace(os.sep, '/')
+
+
+def key(filename, features=None):
+    """Cache key for the current contents of the given file and (optionally) the given transform parameters"""
+    mtime = os.stat(filename).st_mtime_ns
+    text = json.dumps([normpath(filename), mtime, features.params() if features else None], sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def load_index():
+    global index
+    if index is None:
+        try:
+            with open(f'{cache_dir}/index.json') as file:
+                index = json.load(file)
+        except (FileNotFoundError, ValueError):
+            index = {}
+    return index
+
+
+def save_index():
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f'{cache_dir}/index.tmp', 'w') as file:
+        json.dump(index, file, indent=1, sort_keys=True)
+    os.replace(f'{cache_dir}/index.tmp', f'{cache_dir}/index.json')
+
+
+def store(name, entry, files):
+    """Save arrays to the cache and record them in the index under the given name, removing any stale files"""
+    os.makedirs(cache_dir, exist_ok=True)
+    for file, array in files.items():
+        np.save(f'{cache_dir}/{entry[file]}', array)
+    with lock:
+        old = load_index().get(name)
+        index[name] = entry
+        save_index()
+    if old and old["key"] != entry["key"]:
+        for file in files:
+            try:
+                os.remove(f'{cache_dir}/{old[file]}')
+            except FileNotFoundError:
+                pass
+    return entry
+
+
+def build_audio(filename):
+    """Decode the given song into the cache and return its index entry"""
+    path = normpath(filename)
+    import soundfile as sf
+    entry_key = key(filename)
+    data, fs = sf.read(filename, dtype='float32')
+    name = os.path.splitext(os.path.basename(path))[0]
+    entry = {"key": entry_key, "samplerate": fs, "audio": f'{name}-{entry_key}.pcm.npy'}
+    return store(path, entry, {"audio": data})
+
+
+def build_transform(filename, data, fs, features):
+    """Compute the transform of the given decoded song into the cache and return its index entry"""
+    path = normpath(filename)
+    entry_key = key(filename, features)
+    mono = data if data.ndim == 1 else data.mean(axis=1)
+    transform = features.transform(mono[::fs // features.samplerate])
+    name = os.path.splitext(os.path.basename(path))[0]
+    entry = {"key": entry_key, "transform": f'{name}-{entry_key}.npy'}
+    return store(f'{path}#{features.key()}', entry, {"transform": transform})
+
+
+def cached(name, entry_key, file):
+    """Memory-map a file from the cache if its index entry is up to date, otherwise return None"""
+    entry = load_index().get(name)
+    if not entry or entry["key"] != entry_key:
+        return None
+    try:
+        return np.load(f'{cache_dir}/{entry[file]}', mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def load(filename, features=None):
+    """
+    Load the decoded samples and reference transform of a song, building the cache entries if missing or stale.
+
+    :param filename: Path of the WAV file, e.g. "audio/Owl3.wav"
+    :param features: Features to compute the transform with (defaults to birdcall.default_features)
+    :return: Tuple of (samples, samplerate, transform) with both arrays memory-mapped, the samples from the asset pack
+             if it has been built (see pack.py) and otherwise from the cache
+    """
+
+    features = features or birdcall.default_features
+    path = normpath(filename)
+    name = f'{path}#{features.key()}'
+    audio_key = key(filename)
+    transform_key = key(filename, features)
+    if name in entries and entries[name][0] == transform_key:
+        return entries[name][1]
+
+    packed = pack.samples(filename)
+    if packed is not None:
+        data, fs = packed
+    else:
+        data = cached(path, audio_key, "audio")
+        if data is None:
+            build_audio(filename)
+            data = cached(path, audio_key, "audio")
+        fs = index[path]["samplerate"]
+    transform = cached(name, transform_key, "transform")
+    if transform is None:
+        build_transform(filename, data, fs, features)
+        transform = cached(name, transform_key, "transform")
+    entries[name] = (transform_key, (data, fs, transform))
+    return entries[name][1]
+
+
+def songs():
+    """All WAV files in the audio directory"""
+    return sorted(glob.glob(f'{audio_dir}/*.wav'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the reference transform cache")
+    parser.add_argument("--features", choices=("default", "compact"), default="default")
+    args = parser.parse_args()
+    features = birdcall.default_features if args.features == "default" else feature_sets.COMPACT
+    for song in songs():
+        if load_index().get(f'{normpath(song)}#{features.key()}', {}).get("key") == key(song, features):
+            print("Up to date:", song)
+        else:
+            load(song, features)
+            print("Built:", song)
@@ -0,0 +1,76 @@
+"""
+Dirty-rectangle rendering: blits are recorded into a display list, and only the areas of the screen that differ from
+the previous frame are redrawn and uploaded.
+"""
+
+import pygame
+
+
+class Renderer:
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.items = []
+        self.previous = None
+
+    def blit(self, source, dest):
+        """Record a blit, with the same arguments as pygame.Surface.blit"""
+        # Surface.blit truncates fractional positions, whereas Rect would round them
+        rect = source.get_rect(topleft=(int(dest[0]), int(dest[1])))
+        self.items.append(((source, source.get_alpha()), rect))
+        return rect
+
+    def fill(self, color, rect):
+        """Record a solid rectangle, with the same arguments as pygame.Surface.fill"""
+        rect = pygame.Rect(rect)
+        self.items.append(((tuple(color), None), rect))
+        return rect
+
+    def invalidate(self):
+        """Redraw the whole screen on the next frame (e.g. after the window was covered)"""
+        self.previous = None
+
+    def present(self):
+        """
+        Redraw the parts of the screen that changed since the previous frame.
+
+        :return: List of the changed rectangles, for pygame.display.update (empty if nothing changed)
+        """
+
+        items, self.items = self.items, []
+        current = [(key, tuple(rect)) for key, rect in items]
+        if self.previous is None:
+            dirty = [self.screen.get_rect()]
+        else:
+            # The previous display list is kept alive until now, so the ids of its surfaces cannot have been reused
+            changed = set(current).symmetric_difference(self.previous)
+            dirty = [pygame.Rect(rect) for key, rect in changed]
+            dirty = [rect for rect in dirty if rect.w and rect.h]
+        self.previous = current
+        if not dirty:
+            return []
+
+        for area in merge(dirty):
+            self.screen.set_clip(area)
+            for (source, alpha), rect in items:
+                if not rect.colliderect(area):
+                    continue
+                if isinstance(source, pygame.Surface):
+                    self.screen.blit(source, rect)
+                else:
+                    self.screen.fill(source, rect)
+        self.screen.set_clip(None)
+        return dirty
+
+
+def merge(rects):
+    """Combine overlapping rectangles, so no area is redrawn twice"""
+    merged = []
+    for rect in sorted(rects, key=lambda r: r.w * r.h, reverse=True):
+        for i, other in enumerate(merged):
+            if rect.colliderect(other):
+                merged[i] = other.union(rect)
+                break
+        else:
+            merged.append(rect)
+    return merged
@@ -0,0 +1,88 @@
+"""
+Recording analysis on a worker thread, so that scoring never stalls the frame loop.
+
+NumPy releases the GIL inside its FFT and array kernels, so a single worker thread gives real concurrency without the
+cost of copying recordings and reference transforms into another process. With several players, their services share
+one pool of workers (see pool).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class ScoringService:
+
+    def __init__(self, timeout=2, executor=None):
+        """
+        :param timeout: Seconds to wait for the worker before scoring synchronously instead
+        :param executor: Worker pool shared with other services, e.g. one service per player (see pool), or None for a
+                         worker thread of its own
+        """
+
+        self.owned = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self.timeout = timeout
+        self.update = None
+        self.future = None
+        self.scorer = None
+        self.sound = None
+
+    def feed(self, scorer, sound):
+        """
+        Update the given Scorer with the recording so far, unless the previous update is still running. Updates are
+        cumulative, so skipping one only delays the partial score.
+        """
+
+        if self.update is None or self.update.done():
+            self.update = self.executor.submit(scorer.update, sound)
+
+    def submit(self, scorer, sound):
+        """Start computing the final score of a complete recording"""
+        self.scorer = scorer
+        self.sound = sound
+        self.future = self.executor.submit(self.finish, scorer, sound, self.update)
+        return self.future
+
+    @staticmethod
+    def finish(scorer, sound, update):
+        """
+        Score the complete recording once the last update has finished, since both change the scorer. The update was
+        queued first, so on a shared pool it is already running or done by the time this starts.
+        """
+
+        if update is not None:
+            wait([update])
+        return scorer.finish(sound)
+
+    def poll(self, elapsed):
+        """
+        Check on the submitted recording.
+
+        :param elapsed: Seconds since the recording was submitted
+        :return: The score, or None while the worker is still busy. If the worker fails or takes longer than the
+                 timeout, the recording is scored synchronously instead.
+        """
+
+        if not self.future.done() and elapsed < self.timeout:
+            return None
+        try:
+            return self.future.result(timeout=0)
+        except Exception:
+            self.future.cancel()
+            print("Scoring worker failed or timed out, scoring synchronously")
+            return self.scorer.score(self.sound)
+
+    def shutdown(self):
+        if self.owned:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pool(workers=None):
+    """
+    A worker pool to share between the ScoringServices of several players, so that their recordings are scored in
+    parallel.
+
+    :param workers: Number of worker threads (defaults to one per CPU core)
+    """
+
+    return ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix="scoring")
@@ -0,0 +1,193 @@
+"""
+Headless simulation of whole playthroughs, for soak testing and catching performance regressions without a display,
+speakers or a microphone.
+
+The game runs on the dummy SDL drivers with a fixed timestep, as fast as possible, and the microphone is replaced by a
+simulated one that sings a recorded take (or the reference song itself) whenever the game starts listening. Background
+work is waited for at the start of every tick and all randomness is seeded, so a run with the same seed and takes
+replays exactly (compare the printed trace digest).
+
+Usage: python simulate.py [--seed 0] [--takes DIR] [--playthroughs 1] [--fps 60] [--draw]
+
+Takes are looked up as DIR/<Bird><n>.wav, e.g. takes/Owl2.wav, falling back to the reference song.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+
+class FakeStream:
+    """Stands in for sounddevice.InputStream; samples are pushed into it by the simulation"""
+
+    def __init__(self, device, callback):
+        self.device = device
+        self.callback = callback
+        self.active = False
+
+    def __enter__(self):
+        self.device.stream = self
+        self.active = True
+        return self
+
+    def __exit__(self, *args):
+        self.active = False
+        if self.device.stream is self:
+            self.device.stream = None
+
+
+class FakeSoundDevice:
+    """Stands in for the sounddevice module, with a single simulated microphone and no playback"""
+
+    def __init__(self):
+        self.stream = None
+
+    def InputStream(self, device=None, channels=1, blocksize=None, samplerate=None, callback=None):
+        return FakeStream(self, callback)
+
+    def query_devices(self):
+        return "0 Simulated microphone, 1 in, 0 out"
+
+    def play(self, data, fs):
+        pass
+
+    def stop(self):
+        pass
+
+    def wait(self):
+        pass
+
+
+# The game must never open real audio devices, so the simulated one is installed before birdcall is imported
+sounddevice = FakeSoundDevice()
+sys.modules['sounddevice'] = sounddevice
+
+import pygame
+
+import birdcall
+import main
+
+
+class Simulation:
+
+    def __init__(self, seed=0, takes=None, fps=60, draw=False):
+        """
+        :param seed: Seed for every random choice in the game and for the microphone noise
+        :param takes: Directory of recorded takes to sing, or None to sing the reference songs
+        :param fps: Simulated frames per second (the timestep is 1/fps seconds)
+        :param draw: Also draw every frame (with the dirty-rectangle renderer)
+        """
+
+        random.seed(seed)
+        self.rng = np.random.default_rng(seed)
+        self.takes = takes
+        self.draw = draw
+        self.dt = 1000 / fps
+        self.game = main.Game(fps=fps)
+        self.ticks = 0
+        self.samples = 0.0
+        self.song = np.zeros(0, dtype=np.float32)
+        self.trace = []
+
+    def take(self):
+        """The recording the simulated player sings in response to the current song"""
+        filename = self.game.bird.song()
+        if self.takes and os.path.exists(f'{self.takes}/{os.path.basename(filename)}'):
+            filename = f'{self.takes}/{os.path.basename(filename)}'
+        data, fs = sf.read(filename, dtype='float32')
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+        # About half a second of silence first, a whole number of blocks long so that onset detection sees the first
+        # block of the song in full (as it would from a singer who starts cleanly)
+        silence = np.zeros(birdcall.samplerate // 2 // birdcall.blocksize * birdcall.blocksize, dtype=np.float32)
+        return np.concatenate((silence, data[::max(fs // birdcall.samplerate, 1)], silence))
+
+    def listen(self):
+        """Deliver one timestep of microphone input to the open input stream, in blocks like a real device"""
+        self.samples += birdcall.samplerate * self.dt / 1000
+        while self.samples >= birdcall.blocksize:
+            self.samples -= birdcall.blocksize
+            block = self.rng.normal(0, 0.0005, birdcall.blocksize).astype(np.float32)
+            n = min(len(self.song), birdcall.blocksize)
+            block[:n] += self.song[:n]
+            self.song = self.song[n:]
+            if sounddevice.stream:
+                sounddevice.stream.callback(block[:, None], birdcall.blocksize, None, None)
+
+    def settle(self):
+        """Wait for all background work, so that the outcome never depends on thread timing"""
+        game = self.game
+        futures = list(game.prefetcher.futures.values())
+        futures += [future for future in (game.scoring.update, game.scoring.future) if future]
+        concurrent.futures.wait(futures)
+        while not game.preloader.finished:
+            concurrent.futures.wait([future for *_, future in game.preloader.pending])
+            game.preloader.poll(budget=float('inf'))
+
+    def tick(self):
+        game = self.game
+        self.settle()
+        state = game.state
+        game.update(self.dt, None)
+        if game.state != state:
+            self.trace.append((self.ticks, game.state, game.level, game.bird.progress, round(float(game.score), 6)))
+            if game.state == "Waiting":
+                self.song = self.take()
+        self.listen()
+        if self.draw:
+            game.draw(game.renderer)
+            game.renderer.present()
+        self.ticks += 1
+
+    def run(self, playthroughs=1, max_ticks=10**7):
+        """
+        Play until the given number of playthroughs reach the Victory screen.
+
+        :return: Number of completed playthroughs
+        """
+
+        completed = 0
+        while self.ticks < max_ticks:
+            if self.game.state in ("Splash", "Victory"):
+                if self.game.state == "Victory":
+                    completed += 1
+                    if completed >= playthroughs:
+                        break
+                self.settle()
+                self.game.key_pressed(pygame.K_SPACE)
+            self.tick()
+        return completed
+
+    def digest(self):
+        """Hash of every state change, for checking that two runs were identical"""
+        return hashlib.sha1(repr(self.trace).encode()).hexdigest()[:16]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play the game headlessly with a simulated microphone")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--takes", default=None, help="Directory of recorded takes, e.g. takes/Owl2.wav")
+    parser.add_argument("--playthroughs", type=int, default=1)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--max-ticks", type=int, default=10**7)
+    parser.add_argument("--draw", action="store_true", help="Also draw every frame")
+    args = parser.parse_args()
+
+    simulation = Simulation(args.seed, args.takes, args.fps, args.draw)
+    start = time.perf_counter()
+    completed = simulation.run(args.playthroughs, args.max_ticks)
+    elapsed = time.perf_counter() - start
+    print(f"{completed} playthrough(s) in {simulation.ticks} ticks ({simulation.ticks * simulation.dt / 1000:.0f} s "
+          f"of game time) in {elapsed:.1f} s: {simulation.ticks / elapsed:.0f} ticks/s, "
+          f"trace digest {simulation.digest()}")
+    pygame.quit()
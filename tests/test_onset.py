@@ -0,0 +1,92 @@
+"""
+Onset detection in birdcall.Session.record must trigger on the same block as the original block-by-block loop, which is
+kept here as the reference.
+"""
+
+import numpy as np
+import pytest
+
+import birdcall
+
+blocksize = birdcall.blocksize
+samplerate = birdcall.samplerate
+
+
+def reference_trigger(blocks, max_delay=0):
+    """The block the original loop started recording on, "Timeout", or None if it was still waiting"""
+    old_volume = 0
+    delay = 0
+    for i, data in enumerate(blocks):
+        delay += len(data)
+        volume = np.mean(np.abs(data))
+        if not old_volume:
+            old_volume = volume
+        elif delay > 0.1 * samplerate and volume / old_volume > 30:
+            return i
+        elif max_delay and delay > max_delay * samplerate:
+            return "Timeout"
+        window = min(delay, samplerate * 0.2)
+        old_volume = ((window - len(data)) * old_volume + len(data) * volume) / window
+    return None
+
+
+def trigger(blocks, max_delay=0, chunk=None, monkeypatch=None):
+    """The block Session.record started recording on, fed chunk blocks between calls (all at once by default)"""
+    monkeypatch.setattr(birdcall, "preroll", 0)
+    session = birdcall.Session()
+    session.start(len(blocks) * blocksize / samplerate + 1)
+    chunk = chunk or len(blocks)
+    for i in range(0, len(blocks), chunk):
+        for block in blocks[i:i+chunk]:
+            session.write(block)
+        state, _ = session.record(100, max_delay)
+        if state == "Recording":
+            # Without pre-roll the onset is a sample of the triggering block
+            return (session.onset - session.armed) // blocksize
+        if state == "Timeout":
+            return state
+    return None
+
+
+def noise(rng, level, count):
+    return [rng.normal(0, level, blocksize).astype(np.float32) for _ in range(count)]
+
+
+def scenarios():
+    rng = np.random.default_rng(0)
+    silent = [np.zeros(blocksize, dtype=np.float32)]
+    yield "muted start", silent * 10 + noise(rng, 0.001, 3) + noise(rng, 0.015, 5), 0
+    yield "muted start, loud", silent * 10 + noise(rng, 0.001, 10) + noise(rng, 0.1, 5), 0
+    yield "quiet", noise(rng, 0.001, 200), 0
+    yield "onset", noise(rng, 0.001, 60) + noise(rng, 0.2, 5), 0
+    yield "early onset", noise(rng, 0.001, 2) + noise(rng, 0.2, 60), 0
+    yield "all silent", silent * 50, 0
+    yield "timeout", noise(rng, 0.001, 200), 0.5
+    yield "timeout after silence", silent * 300 + noise(rng, 0.001, 5), 0.5
+    for seed in range(20):
+        rng = np.random.default_rng(seed)
+        lead = rng.integers(0, 20)
+        blocks = silent * lead + noise(rng, rng.uniform(1e-4, 1e-2), rng.integers(1, 100))
+        yield f"random {seed}", blocks + noise(rng, rng.uniform(1e-3, 0.5), 10), 0
+
+
+@pytest.mark.parametrize("name, blocks, max_delay", list(scenarios()), ids=lambda value: value
+                         if isinstance(value, str) else "")
+@pytest.mark.parametrize("chunk", [None, 1, 7])
+def test_same_trigger_block(name, blocks, max_delay, chunk, monkeypatch):
+    assert trigger(blocks, max_delay, chunk, monkeypatch) == reference_trigger(blocks, max_delay)
+
+
+@pytest.mark.parametrize("max_delay", [0, 0.5])
+def test_indices_stay_python_ints(max_delay):
+    rng = np.random.default_rng(0)
+    blocks = noise(rng, 0.001, 100) + noise(rng, 0.2, 10)
+    session = birdcall.Session()
+    session.start(len(blocks) * blocksize / samplerate + 1)
+    for block in blocks:
+        session.write(block)
+    state, _ = session.record(100, max_delay)
+    assert state == ("Timeout" if max_delay else "Recording")
+    for value in (session.onset, session.buffer.tail, session.buffer.head, session.delay):
+        assert type(value) is int
+    assert type(session.old_volume) is float